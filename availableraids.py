@@ -5,20 +5,49 @@
 from __future__ import annotations
 
 import argparse
+import codecs
+import contextlib
+import fcntl
+import hashlib
+import html as html_lib
 import json
+import os
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from html.parser import HTMLParser
 from pathlib import Path
-from typing import Dict, List, Optional
-from urllib.parse import unquote, urljoin
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote, unquote_to_bytes, urljoin, urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from raid import (
+    SNAPSHOT_FORMAT,
+    VERSION_STRUCT,
+    changelog_path,
+    compact_raid,
+    normalize_type,
+    resolve_raid,
+    run_report_path,
+    snapshot_file_path,
+    source_timezone,
+    version_file_path,
+)
 
 POKEBATTLER_RAIDS_URL = "https://www.pokebattler.com/raids"
 DEFAULT_OUTPUT = "available_raids.json"
 USER_AGENT = "Mozilla/5.0 (compatible; RaidFetcher/1.0; +https://www.pokebattler.com/)"
+DEFAULT_CONCURRENCY = 4
+DEFAULT_FETCH_BUDGET = 120.0
+REQUEST_TIMEOUT = 20.0
+IMAGE_CACHE_TTL = 30 * 24 * 60 * 60
+NEGATIVE_IMAGE_CACHE_TTL = 24 * 60 * 60
+UPCOMING_WINDOW_MS = 3 * 24 * 60 * 60 * 1000
 
 
 class RaidLinkParser(HTMLParser):
@@ -121,19 +150,47 @@ class RaidLinkParser(HTMLParser):
             self._capture_difficulty = False
 
 
-def create_session() -> requests.Session:
+def create_session(pool_size: int = DEFAULT_CONCURRENCY) -> requests.Session:
     session = requests.Session()
     session.headers.update({"User-Agent": USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     return session
 
 
-def fetch_html(url: str, session: Optional[requests.Session] = None) -> str:
+def fetch_html(
+    url: str,
+    session: Optional[requests.Session] = None,
+    timeout: float = REQUEST_TIMEOUT,
+) -> str:
     requester = session or requests
-    response = requester.get(url, timeout=20)
+    response = requester.get(url, timeout=timeout)
     response.raise_for_status()
     return response.text
 
 
+class FetchBudgetExhausted(TimeoutError):
+    """A detail page fetch that the run's fetch budget did not leave time for."""
+
+
+class HostLimiter:
+    """Cap the number of in-flight requests per host."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+
+    def for_url(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.Semaphore(self.limit)
+            return semaphore
+
+
 def extract_rehydrate_blob(html: str) -> Dict:
     match = re.search(
         r"window\.REHYDRATE=JSON\.parse\(decodeURIComponent\(\"(.*?)\"\)\)",
@@ -146,10 +203,276 @@ def extract_rehydrate_blob(html: str) -> Dict:
     return json.loads(decoded)
 
 
-def extract_display_metadata(html: str) -> Dict[str, Dict[str, Optional[str]]]:
+REHYDRATE_MARKER = 'window.REHYDRATE=JSON.parse(decodeURIComponent("'
+REHYDRATE_CHUNK_SIZE = 64 * 1024
+_json_structure_pattern = re.compile(r'["{}\[\]]')
+_json_string_pattern = re.compile(r'["\\]')
+
+
+def _decode_json_value(encoded: str, pos: int, end: int) -> object:
+    """Percent-decode and parse the single JSON object/array starting at encoded[pos].
+
+    Decoding proceeds chunk by chunk and stops as soon as the value is closed, so only
+    the value itself is ever materialized.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pieces: List[str] = []
+    depth = 0
+    in_string = False
+    escaped = False
+    while pos < end:
+        chunk_end = min(pos + REHYDRATE_CHUNK_SIZE, end)
+        # Never split a %XX escape across chunks.
+        percent = encoded.rfind("%", max(pos, chunk_end - 2), chunk_end)
+        if percent >= 0 and chunk_end < end:
+            chunk_end = percent
+        text = decoder.decode(unquote_to_bytes(encoded[pos:chunk_end]))
+        pos = chunk_end
+        index = 0
+        if escaped and text:
+            escaped = False
+            index = 1
+        while True:
+            if in_string:
+                match = _json_string_pattern.search(text, index)
+                if not match:
+                    break
+                index = match.end()
+                if match.group() == "\\":
+                    if index >= len(text):
+                        escaped = True
+                        break
+                    index += 1
+                else:
+                    in_string = False
+                continue
+            match = _json_structure_pattern.search(text, index)
+            if not match:
+                break
+            index = match.end()
+            char = match.group()
+            if char == '"':
+                in_string = True
+            elif char in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    pieces.append(text[:index])
+                    return json.loads("".join(pieces))
+        pieces.append(text)
+    raise RuntimeError("REHYDRATE payload ended inside a JSON value")
+
+
+# Percent escapes may use either case for their hex digits (%5C and %5c are both a backslash).
+_encoded_structure_pattern = re.compile(r"%(?:7B|7D|5B|5D|22)", re.IGNORECASE)
+_encoded_spaces_pattern = re.compile(r"(?:%20)*")
+
+
+def _encoded_at(html: str, pos: int, escapes: Tuple[str, ...]) -> bool:
+    """Whether one of the uppercase %XX escapes starts at html[pos], in either case."""
+    return pos >= 0 and html[pos:pos + 3].upper() in escapes
+
+
+def _encoded_pattern(text: str) -> re.Pattern[str]:
+    """Regex for text as encodeURIComponent writes it, matching %XX escapes in either case."""
+    parts = re.split(r"(%[0-9A-F]{2})", quote(text, safe=""))
+    return re.compile("".join(
+        f"(?i:{part})" if part.startswith("%") else re.escape(part) for part in parts
+    ))
+
+
+def _encoded_string_end(html: str, pos: int, end: int) -> int:
+    """Index just past the percent-encoded JSON string whose opening %22 ends at pos."""
+    while True:
+        quote_at = html.find("%22", pos, end)
+        if quote_at < 0:
+            return end
+        backslashes = 0
+        while _encoded_at(html, quote_at - 3 * (backslashes + 1), ("%5C",)):
+            backslashes += 1
+        pos = quote_at + 3
+        if backslashes % 2 == 0:
+            return pos
+
+
+def extract_rehydrate_stores(html: str, keys=("raidsStore",), start: int = 0) -> Dict:
+    """Pull only the named top-level stores out of the REHYDRATE payload.
+
+    Unlike extract_rehydrate_blob this never decodes the whole multi-megabyte blob: the
+    encoded payload is walked for structure only (so a nested key of the same name is not
+    mistaken for the store) up to the last store wanted, and only those values are decoded.
+    Stores that cannot be located are simply missing from the result.
+    """
+    begin = html.find(REHYDRATE_MARKER, start)
+    if begin < 0:
+        raise RuntimeError("Unable to locate REHYDRATE payload in page")
+    begin += len(REHYDRATE_MARKER)
+    # encodeURIComponent escapes every double quote, so the first one closes the payload.
+    end = html.find('"', begin)
+    if end < 0:
+        raise RuntimeError("Unterminated REHYDRATE payload in page")
+    needles = {key: _encoded_pattern(json.dumps(key) + ":") for key in keys}
+    stores: Dict[str, object] = {}
+    depth = 0
+    pos = begin
+    while len(stores) < len(needles):
+        match = _encoded_structure_pattern.search(html, pos, end)
+        if not match:
+            break
+        pos = match.end()
+        token = match.group().upper()
+        if token in ("%7B", "%5B"):
+            depth += 1
+        elif token in ("%7D", "%5D"):
+            depth -= 1
+        else:
+            string_start = match.start()
+            pos = _encoded_string_end(html, pos, end)
+            if depth != 1:
+                continue
+            for key, needle in needles.items():
+                found = needle.match(html, string_start, end) if key not in stores else None
+                if found:
+                    value_start = _encoded_spaces_pattern.match(html, found.end(), end).end()
+                    # Only objects and arrays are streamed; anything else is left to the full decoder.
+                    if _encoded_at(html, value_start, ("%7B", "%5B")):
+                        stores[key] = _decode_json_value(html, value_start, end)
+    return stores
+
+
+class PageScan:
+    """Everything scan_page collects from one pass over a Pokebattler page."""
+
+    def __init__(self) -> None:
+        self.results: Dict[str, Dict[str, Optional[str]]] = {}
+        self.rehydrate_offset = -1
+        self.og_image: Optional[str] = None
+        self.boss_icon: Optional[str] = None
+
+
+_page_landmark_pattern = re.compile(
+    r'(?P<table><table\b)'
+    r'|(?P<rehydrate>window\.REHYDRATE=)'
+    r'|<meta[^>]+property="og:image"[^>]+content="(?P<og_image>[^"]+)"'
+    r'|(?P<boss_icon>(?:https?:)?//static\.pokebattler\.com/assets/pokemon/256/[^"\'<>\s]+)',
+    re.IGNORECASE,
+)
+_table_token_pattern = re.compile(
+    r'<(/?)([a-zA-Z][^\s/>]*)((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>|<!--.*?-->|<![^>]*>|<\?[^>]*>',
+    re.DOTALL,
+)
+_attribute_pattern = re.compile(r'([^\s/>=]+)(?:\s*=\s*(\'[^\']*\'|"[^"]*"|[^\s>]*))?')
+_ROW_TAGS = {"tr", "a", "img", "image", "span"}
+_RAW_TEXT_CLOSE = {tag: re.compile(rf"</\s*{tag}\s*>", re.IGNORECASE) for tag in ("script", "style")}
+
+
+def _parse_attributes(text: str) -> List[Tuple[str, Optional[str]]]:
+    attrs: List[Tuple[str, Optional[str]]] = []
+    for name, value in _attribute_pattern.findall(text):
+        if not value:
+            attrs.append((name.lower(), None))
+            continue
+        if value[:1] in {"'", '"'}:
+            value = value[1:-1]
+        attrs.append((name.lower(), html_lib.unescape(value)))
+    return attrs
+
+
+def _scan_table(html: str, start: int, parser: RaidLinkParser) -> int:
+    """Feed the raid-row events of the table opened at start to parser's handlers.
+
+    Returns the index just past the </table> closing it. Table nesting is tracked on
+    the same tokens, so a "</table>" inside script text cannot end the scan early.
+    """
+    depth = 0
+    pos = start
+    end = len(html)
+    while pos < end:
+        match = _table_token_pattern.search(html, pos)
+        text_end = match.start() if match else end
+        if text_end > pos and parser._current_row is not None:
+            parser.handle_data(html_lib.unescape(html[pos:text_end]))
+        if not match:
+            break
+        pos = match.end()
+        tag = match.group(2)
+        if not tag:
+            continue
+        tag = tag.lower()
+        if match.group(1):
+            parser.handle_endtag(tag)
+            if tag == "table":
+                depth -= 1
+                if depth == 0:
+                    return pos
+            continue
+        self_closing = match.group(3).rstrip().endswith("/")
+        if tag == "table" and not self_closing:
+            depth += 1
+        elif tag in _ROW_TAGS:
+            parser.handle_starttag(tag, _parse_attributes(match.group(3)))
+            if self_closing:
+                parser.handle_endtag(tag)
+        elif tag in _RAW_TEXT_CLOSE and not self_closing:
+            # HTMLParser hands script/style content to handle_data verbatim (no charref
+            # decoding) and holds an unterminated element back entirely.
+            close = _RAW_TEXT_CLOSE[tag].search(html, pos)
+            if close is None:
+                break
+            if close.start() > pos and parser._current_row is not None:
+                parser.handle_data(html[pos:close.start()])
+            parser.handle_endtag(tag)
+            pos = close.end()
+    return end
+
+
+def scan_page(html: str) -> PageScan:
+    """Single pass over a page: raid rows inside tables plus the landmarks around them.
+
+    Produces the same display metadata as RaidLinkParser but only tokenizes table markup,
+    and records the REHYDRATE payload offset, og:image and first 256px boss icon on the way.
+    """
+    scan = PageScan()
     parser = RaidLinkParser()
-    parser.feed(html)
-    return parser.results
+    parser.results = scan.results
+    pos = 0
+    while True:
+        match = _page_landmark_pattern.search(html, pos)
+        if not match:
+            break
+        pos = match.end()
+        if match.group("table"):
+            end = _scan_table(html, match.start(), parser)
+            if scan.boss_icon is None:
+                icon_match = boss_icon_pattern.search(html, match.start(), end)
+                if icon_match:
+                    scan.boss_icon = icon_match.group(0)
+            pos = end
+        elif match.group("rehydrate"):
+            if scan.rehydrate_offset < 0:
+                scan.rehydrate_offset = match.start()
+            # Nothing of interest inside the percent-encoded payload; skip to its closing quote.
+            quote_start = html.find('"', pos)
+            closing = html.find('"', quote_start + 1) if quote_start >= 0 else -1
+            pos = closing + 1 if closing >= 0 else pos
+        elif match.group("og_image"):
+            if scan.og_image is None:
+                scan.og_image = match.group("og_image")
+            # The meta tag is consumed whole, so a boss icon used as og:image is only seen here.
+            if scan.boss_icon is None:
+                icon_match = boss_icon_pattern.search(html, match.start("og_image"), match.end("og_image"))
+                if icon_match:
+                    scan.boss_icon = icon_match.group(0)
+        elif scan.boss_icon is None:
+            scan.boss_icon = match.group("boss_icon")
+    if scan.boss_icon and scan.boss_icon.startswith("//"):
+        scan.boss_icon = f"https:{scan.boss_icon}"
+    return scan
+
+
+def extract_display_metadata(html: str) -> Dict[str, Dict[str, Optional[str]]]:
+    return scan_page(html).results
 
 
 def humanize_tier(tier: str) -> str:
@@ -179,6 +502,50 @@ def format_timestamp(ms: Optional[int], fallback: Optional[str]) -> Optional[str
     return fallback
 
 
+BOSS_TYPE_KEYS = (("pokemonType1", "pokemonType2"), ("type", "type2"))
+
+
+def boss_types(entry: Dict) -> List[str]:
+    """Canonical types from pokemonType1/2 or type/type2 fields ("POKEMON_TYPE_FIRE", "Fire", ...)."""
+    for keys in BOSS_TYPE_KEYS:
+        types: List[str] = []
+        for key in keys:
+            value = entry.get(key)
+            if isinstance(value, str):
+                ptype = normalize_type(value.strip().lower().removeprefix("pokemon_type_"))
+                if ptype and ptype not in types:
+                    types.append(ptype)
+        if types:
+            return types
+    return []
+
+
+def index_boss_types(store: object) -> Dict[str, List[str]]:
+    """Map pokemon ids to types for every object in a REHYDRATE store that carries both."""
+    index: Dict[str, List[str]] = {}
+    pending = [store]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(node)
+        elif isinstance(node, dict):
+            pokemon_id = node.get("pokemonId") or node.get("pokemon")
+            if isinstance(pokemon_id, str):
+                types = boss_types(node)
+                if types:
+                    index.setdefault(pokemon_id, types)
+            pending.extend(value for value in node.values() if isinstance(value, (dict, list)))
+    return index
+
+
+def raids_missing_types(data_blob: Dict) -> bool:
+    return any(
+        not boss_types(raid)
+        for tier_info in data_blob.get("raidsStore", {}).values()
+        for raid in tier_info.get("raids", [])
+    )
+
+
 def build_raid_entries(
     data_blob: Dict,
     display_map: Dict[str, Dict[str, Optional[str]]],
@@ -186,8 +553,10 @@ def build_raid_entries(
 ) -> List[Dict[str, Optional[str]]]:
     raids: List[Dict[str, Optional[str]]] = []
     raids_store = data_blob.get("raidsStore", {})
+    # Raid entries normally carry their boss types; the pokemon store is the fallback.
+    type_index = index_boss_types(data_blob.get("pokemonStore"))
     now_ms = datetime.now(timezone.utc).timestamp() * 1000
-    upcoming_cutoff = now_ms + 3 * 24 * 60 * 60 * 1000
+    upcoming_cutoff = now_ms + UPCOMING_WINDOW_MS
     seen_keys = set()
     for tier_info in raids_store.values():
         for raid in tier_info.get("raids", []):
@@ -225,6 +594,7 @@ def build_raid_entries(
                 "tier": humanize_tier(raid.get("tier", "")),
                 "tier_raw": raid.get("tier"),
                 "pokebattler_url": urljoin(base_url, f"/raids/{slug}"),
+                "types": boss_types(raid) or type_index.get(slug) or type_index.get(raid.get("pokemon")) or [],
                 "_slug": slug,
             }
             raids.append(entry)
@@ -241,6 +611,10 @@ def _extract_icon_url(html: str, display_name: Optional[str]) -> Optional[str]:
     if boss_match:
         url = boss_match.group(0)
         return f"https:{url}" if url.startswith("//") else url
+    return _extract_svg_icon_url(html, display_name)
+
+
+def _extract_svg_icon_url(html: str, display_name: Optional[str]) -> Optional[str]:
     if display_name:
         escaped = re.escape(display_name)
         svg_pattern = re.compile(
@@ -255,65 +629,565 @@ def _extract_icon_url(html: str, display_name: Optional[str]) -> Optional[str]:
     return None
 
 
+def fetch_detail_image(
+    slug: str,
+    display_name: Optional[str],
+    session: requests.Session,
+    base_url: str,
+    timeout: float = REQUEST_TIMEOUT,
+) -> Optional[str]:
+    detail_url = urljoin(base_url, f"/raids/{slug}")
+    html = fetch_html(detail_url, session=session, timeout=timeout)
+    scan = scan_page(html)
+    return scan.boss_icon or _extract_svg_icon_url(html, display_name) or scan.og_image
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write text to a temp file next to path and rename it into place."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class ImageCache:
+    """Persistent slug -> boss image/display-name cache shared across scraper runs.
+
+    Found images are kept for ``ttl`` seconds and misses for ``negative_ttl`` seconds.
+    Saving takes an exclusive lock and merges with whatever concurrent runs wrote meanwhile.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: float = IMAGE_CACHE_TTL,
+        negative_ttl: float = NEGATIVE_IMAGE_CACHE_TTL,
+        refresh: bool = False,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh = refresh
+        self.entries: Dict[str, Dict[str, object]] = {}
+        self._updates: Dict[str, Dict[str, object]] = {}
+
+    def _read(self) -> Dict[str, Dict[str, object]]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def load(self) -> None:
+        self.entries = self._read()
+
+    def lookup(self, slug: str) -> Tuple[bool, Optional[str]]:
+        """Return (hit, image); a hit with image None is a cached miss."""
+        if self.refresh:
+            return False, None
+        entry = self.entries.get(slug)
+        if not isinstance(entry, dict):
+            return False, None
+        image = entry.get("image")
+        ttl = self.ttl if image else self.negative_ttl
+        if time.time() - float(entry.get("fetched_at") or 0) > ttl:
+            return False, None
+        return True, image if isinstance(image, str) else None
+
+    def store(self, slug: str, image: Optional[str], name: Optional[str]) -> None:
+        entry = {"image": image, "name": name, "fetched_at": int(time.time())}
+        self.entries[slug] = entry
+        self._updates[slug] = entry
+
+    def save(self) -> None:
+        if not self._updates:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = self.path.with_name(f"{self.path.name}.lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                merged = self._read()
+                merged.update(self._updates)
+                write_atomic(self.path, json.dumps(merged, indent=2, sort_keys=True, ensure_ascii=False) + "\n")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self.entries = merged
+        self._updates = {}
+
+
+class RunReport:
+    """Structured record of one scraper run, written next to the output for monitoring."""
+
+    MAX_ERRORS = 50
+
+    def __init__(self, url: str, output_path: Path) -> None:
+        self.url = url
+        self.output_path = output_path
+        self.status = "running"
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.monotonic()
+        self.timings: Dict[str, float] = {}
+        self.http = {"requests": 0, "bytes": 0}
+        self.raids: Dict[str, int] = {}
+        self.detail_pages = {"cached": 0, "fetched": 0, "failed": 0, "skipped": 0}
+        self.output_written = False
+        self.version: Optional[int] = None
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0.0) + time.monotonic() - started, 4)
+
+    def track_session(self, session: requests.Session) -> None:
+        """Count every response (page and detail pages) and its body size."""
+
+        def on_response(response: requests.Response, *args: object, **kwargs: object) -> None:
+            with self._lock:
+                self.http["requests"] += 1
+                self.http["bytes"] += len(response.content)
+
+        session.hooks["response"].append(on_response)
+
+    def error(self, message: str) -> None:
+        with self._lock:
+            if len(self.errors) < self.MAX_ERRORS:
+                self.errors.append(message)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "status": self.status,
+            "url": self.url,
+            "output": str(self.output_path),
+            "output_written": self.output_written,
+            "version": self.version,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": round(time.monotonic() - self._started, 4),
+            "timings": self.timings,
+            "http": self.http,
+            "raids": self.raids,
+            "detail_pages": self.detail_pages,
+            "errors": self.errors,
+        }
+
+    def write(self, path: Path) -> None:
+        write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+
+def default_report_path(output_path: Path) -> Path:
+    return Path(run_report_path(str(output_path)))
+
+
+def default_image_cache_path(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.images.json")
+
+
 def populate_missing_images(
     raids: List[Dict[str, Optional[str]]],
     session: requests.Session,
     base_url: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    time_budget: float = DEFAULT_FETCH_BUDGET,
+    image_cache: Optional[ImageCache] = None,
+    report: Optional[RunReport] = None,
 ) -> None:
+    """Fill in missing raid images from the boss detail pages.
+
+    Slugs with a fresh ``image_cache`` entry are not fetched at all. The rest are fetched
+    concurrently, at most ``concurrency`` per host, and fetching stops once ``time_budget``
+    seconds have passed. Results are applied in raid order, so the output does not depend
+    on which request finished first. Cache hits, fetches and failures are counted in ``report``,
+    as skipped when the budget ran out before or during the fetch.
+    """
     cache: Dict[str, Optional[str]] = {}
-    image_pattern = re.compile(r'<meta[^>]+property="og:image"[^>]+content="([^"]+)"', re.IGNORECASE)
+    pending: Dict[str, Optional[str]] = {}
     for raid in raids:
-        if raid.get("image"):
-            continue
         slug = raid.get("_slug")
-        if not slug:
+        if raid.get("image") or not slug or slug in pending or slug in cache:
             continue
-        if slug in cache:
+        if image_cache is not None:
+            hit, image = image_cache.lookup(slug)
+            if hit:
+                cache[slug] = image
+                if report is not None:
+                    report.detail_pages["cached"] += 1
+                continue
+        pending[slug] = raid.get("pokemon")
+    if not pending:
+        _apply_images(raids, cache)
+        return
+
+    deadline = time.monotonic() + time_budget
+    limiter = HostLimiter(concurrency)
+
+    def fetch(slug: str, display_name: Optional[str]) -> Optional[str]:
+        with limiter.for_url(urljoin(base_url, f"/raids/{slug}")):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FetchBudgetExhausted("detail page fetch budget exhausted")
+            try:
+                return fetch_detail_image(
+                    slug, display_name, session, base_url, timeout=min(REQUEST_TIMEOUT, remaining)
+                )
+            except requests.Timeout as exc:
+                if remaining < REQUEST_TIMEOUT:
+                    # Cut short by the budget rather than by a slow server.
+                    raise FetchBudgetExhausted("detail page fetch budget exhausted") from exc
+                raise
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = {
+            slug: executor.submit(fetch, slug, display_name) for slug, display_name in pending.items()
+        }
+        wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for slug, future in futures.items():
+        # Failed or unfinished fetches are retried next run rather than cached as misses.
+        if future.done() and not future.cancelled() and future.exception() is None:
+            cache[slug] = future.result()
+            if image_cache is not None:
+                image_cache.store(slug, cache[slug], pending[slug])
+            if report is not None:
+                report.detail_pages["fetched"] += 1
+        elif report is not None:
+            if future.done() and not future.cancelled() and not isinstance(future.exception(), FetchBudgetExhausted):
+                report.detail_pages["failed"] += 1
+                report.error(f"detail page {slug}: {future.exception()}")
+            else:
+                report.detail_pages["skipped"] += 1
+    _apply_images(raids, cache)
+
+
+def _apply_images(raids: List[Dict[str, Optional[str]]], cache: Dict[str, Optional[str]]) -> None:
+    for raid in raids:
+        slug = raid.get("_slug")
+        if not raid.get("image") and slug and cache.get(slug):
             raid["image"] = cache[slug]
-            continue
-        detail_url = urljoin(base_url, f"/raids/{slug}")
-        try:
-            html = fetch_html(detail_url, session=session)
-        except requests.RequestException:
-            cache[slug] = None
-            continue
-        icon_url = _extract_icon_url(html, raid.get("pokemon"))
-        if icon_url:
-            cache[slug] = icon_url
-            raid["image"] = icon_url
-            continue
-        meta_match = image_pattern.search(html)
-        if meta_match:
-            cache[slug] = meta_match.group(1)
-            raid["image"] = meta_match.group(1)
-        else:
-            cache[slug] = None
 
 
-def write_output(path: Path, payload: List[Dict[str, Optional[str]]]) -> None:
-    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+def fetch_page(
+    url: str,
+    session: requests.Session,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> Optional[requests.Response]:
+    """GET url conditionally; returns None when the server answers 304 Not Modified."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return response
+
+
+def next_window_change(data_blob: Dict) -> Optional[int]:
+    """Epoch ms at which a raid beyond the upcoming window would enter it, if any."""
+    now_ms = datetime.now(timezone.utc).timestamp() * 1000
+    starts = [
+        raid["startDate"]
+        for tier_info in data_blob.get("raidsStore", {}).values()
+        for raid in tier_info.get("raids", [])
+        if isinstance(raid.get("startDate"), (int, float)) and raid["startDate"] > now_ms + UPCOMING_WINDOW_MS
+    ]
+    return int(min(starts) - UPCOMING_WINDOW_MS) if starts else None
+
+
+def default_state_path(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.state.json")
+
+
+def load_state(path: Path) -> Dict[str, object]:
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def build_snapshot(raids: List[Dict[str, Optional[str]]]) -> Dict[str, object]:
+    """Build the compact snapshot the web app reads without any per-request parsing.
+
+    Only tier 5+ raids are kept, with epoch-second start/end, the web tier label, a
+    tier class index and an integer difficulty where one is known.
+    """
+    local_tz = source_timezone()
+    resolved = (resolve_raid(raid, local_tz) for raid in raids)
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "raids": [compact_raid(raid) for raid in resolved if raid],
+    }
+
+
+def serialize_output(
+    payload: List[Dict[str, Optional[str]]],
+    output_format: str = "v2",
+    version: Optional[int] = None,
+) -> str:
+    if output_format == "v1":
+        return json.dumps(payload, indent=2, ensure_ascii=False) + "\n"
+    snapshot = build_snapshot(payload)
+    if version is not None:
+        snapshot["version"] = version
+    return json.dumps(snapshot, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def _without_version(text: str) -> str:
+    """text with the change version of a v2 snapshot dropped, for unchanged-content checks."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    if not isinstance(data, dict) or "version" not in data:
+        return text
+    data.pop("version")
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def _unchanged(path: Path, text: str) -> bool:
+    try:
+        return _without_version(path.read_text(encoding="utf-8")) == text
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+MAX_CHANGELOG_ENTRIES = 200
+
+
+def load_snapshot_raids(path: Path) -> Dict[str, Dict[str, object]]:
+    """Compact raids of an existing output file (v1 or v2) keyed by slug; empty if unreadable."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if isinstance(data, list):
+        raids = build_snapshot(data)["raids"]
+    elif isinstance(data, dict) and data.get("format") == SNAPSHOT_FORMAT:
+        raids = data.get("raids", [])
+    else:
+        return {}
+    return {raid["slug"]: raid for raid in raids if isinstance(raid, dict) and raid.get("slug")}
+
+
+def diff_snapshots(
+    previous: Dict[str, Dict[str, object]],
+    current: Dict[str, Dict[str, object]],
+) -> Dict[str, List]:
+    return {
+        "added": [raid for slug, raid in current.items() if slug not in previous],
+        "updated": [raid for slug, raid in current.items() if slug in previous and previous[slug] != raid],
+        "removed": [slug for slug in previous if slug not in current],
+    }
+
+
+def append_changelog(output_path: Path, version: int, changes: Dict[str, List]) -> None:
+    """Add a versioned change entry to the bounded changelog next to output_path.
+
+    Entries at or above version are left over from a run that never published it and are dropped.
+    """
+    path = Path(changelog_path(str(output_path)))
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8")).get("entries", [])
+    except (OSError, ValueError, AttributeError):
+        entries = []
+    entries = [entry for entry in entries if entry.get("version", 0) < version]
+    entries.append({"version": version, "at": datetime.now(timezone.utc).isoformat(), **changes})
+    payload = {"entries": entries[-MAX_CHANGELOG_ENTRIES:]}
+    write_atomic(path, json.dumps(payload, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+
+def publish_output(
+    output_path: Path,
+    payload: List[Dict[str, Optional[str]]],
+    output_format: str = "v2",
+) -> Optional[int]:
+    """Write payload for output_path under the next change version; returns it, or None if unchanged.
+
+    output_path always gets the v1 list, which every raid.py can read. With output_format
+    "v2" the compact snapshot goes to raid.snapshot_file_path(output_path), written after
+    the list so the web app prefers it; with "v1" a leftover one is removed. The compact
+    snapshot is stamped with the version, so readers never pair a body with the wrong counter.
+
+    The shared counter stays locked from reading the current version until the new one is
+    published, and the changelog entry and files are in place before it moves. The counter
+    is updated in place, never replaced, because web workers keep it mapped.
+    """
+    compact_path = Path(snapshot_file_path(str(output_path)))
+    legacy_text = serialize_output(payload, "v1")
+    fd = os.open(version_file_path(str(output_path)), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        current = os.pread(fd, VERSION_STRUCT.size, 0)
+        version = VERSION_STRUCT.unpack(current)[0] + 1 if len(current) == VERSION_STRUCT.size else 1
+        legacy_changed = not _unchanged(output_path, legacy_text)
+        if output_format == "v2":
+            changed = not _unchanged(compact_path, serialize_output(payload, "v2"))
+        else:
+            changed = legacy_changed or compact_path.exists()
+        if not changed:
+            if legacy_changed:
+                # Only raids the snapshot leaves out changed; keep the v2 file the newer one.
+                write_atomic(output_path, legacy_text)
+                os.utime(compact_path)
+            return None
+        previous = load_snapshot_raids(output_path)
+        latest = {raid["slug"]: raid for raid in build_snapshot(payload)["raids"] if raid.get("slug")}
+        append_changelog(output_path, version, diff_snapshots(previous, latest))
+        if legacy_changed:
+            write_atomic(output_path, legacy_text)
+        if output_format == "v2":
+            write_atomic(compact_path, serialize_output(payload, "v2", version))
+        elif compact_path.exists():
+            compact_path.unlink()
+        os.pwrite(fd, VERSION_STRUCT.pack(version), 0)
+        return version
+    finally:
+        os.close(fd)
 
 
 def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--url", default=POKEBATTLER_RAIDS_URL, help="Source page to scrape")
     parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Path to write the JSON payload")
+    parser.add_argument(
+        "--format",
+        choices=["v1", "v2"],
+        default="v2",
+        help="v2 also writes the compact snapshot the web app serves next to the output "
+        "(<stem>.v2.json); v1 only writes the original verbose list, which is always written",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum concurrent detail-page requests per host",
+    )
+    parser.add_argument(
+        "--fetch-budget",
+        type=float,
+        default=DEFAULT_FETCH_BUDGET,
+        help="Total seconds to spend fetching missing boss images",
+    )
+    parser.add_argument(
+        "--image-cache",
+        help="Path of the persistent boss image cache (default: next to --output)",
+    )
+    parser.add_argument(
+        "--refresh-images",
+        action="store_true",
+        help="Ignore cached boss images and fetch every missing one again",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Fetch and rebuild even if the upstream page has not changed",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv: Optional[List[str]] = None) -> int:
     args = parse_args(argv)
-    with create_session() as session:
-        html = fetch_html(args.url, session=session)
-        data_blob = extract_rehydrate_blob(html)
-        display_map = extract_display_metadata(html)
-        raids = build_raid_entries(data_blob, display_map, args.url)
-        populate_missing_images(raids, session, args.url)
-    for raid in raids:
-        raid.pop("_slug", None)
     output_path = Path(args.output)
-    write_output(output_path, raids)
-    print(f"Wrote {len(raids)} raids to {output_path}")
+    report = RunReport(args.url, output_path)
+    try:
+        return run(args, output_path, report)
+    except Exception as exc:
+        report.status = "failed"
+        report.error(f"{type(exc).__name__}: {exc}")
+        raise
+    finally:
+        report.write(default_report_path(output_path))
+
+
+def run(args: argparse.Namespace, output_path: Path, report: RunReport) -> int:
+    state_path = default_state_path(output_path)
+    state = load_state(state_path) if output_path.exists() and not args.force else {}
+    recheck_at = state.get("recheck_at")
+    # A raid entering the upcoming window changes the output even if the page does not.
+    window_fresh = not isinstance(recheck_at, (int, float)) or recheck_at > time.time() * 1000
+    image_cache = ImageCache(
+        Path(args.image_cache) if args.image_cache else default_image_cache_path(output_path),
+        refresh=args.refresh_images,
+    )
+    image_cache.load()
+    with create_session(pool_size=args.concurrency) as session:
+        report.track_session(session)
+        with report.stage("fetch"):
+            response = fetch_page(
+                args.url,
+                session,
+                etag=state.get("etag") if window_fresh else None,  # type: ignore[arg-type]
+                last_modified=state.get("last_modified") if window_fresh else None,  # type: ignore[arg-type]
+            )
+        if response is None:
+            report.status = "not_modified"
+            print(f"{args.url} not modified; keeping {output_path}")
+            return 0
+        html = response.text
+        page_hash = hashlib.sha256(response.content).hexdigest()
+        if window_fresh and state.get("page_hash") == page_hash:
+            report.status = "unchanged"
+            print(f"{args.url} unchanged; keeping {output_path}")
+            return 0
+        with report.stage("parse"):
+            scan = scan_page(html)
+            data_blob = extract_rehydrate_stores(html, start=max(scan.rehydrate_offset, 0))
+            if "raidsStore" not in data_blob:
+                data_blob = extract_rehydrate_blob(html)
+            elif raids_missing_types(data_blob):
+                data_blob.update(
+                    extract_rehydrate_stores(html, keys=("pokemonStore",), start=max(scan.rehydrate_offset, 0))
+                )
+            display_map = scan.results
+            raids = build_raid_entries(data_blob, display_map, args.url)
+        with report.stage("images"):
+            populate_missing_images(
+                raids,
+                session,
+                args.url,
+                concurrency=args.concurrency,
+                time_budget=args.fetch_budget,
+                image_cache=image_cache,
+                report=report,
+            )
+    image_cache.save()
+    for raid in raids:
+        raid["slug"] = raid.pop("_slug", None)
+    report.raids = {
+        "listed": len(display_map),
+        "upcoming": len(raids),
+        "with_image": sum(1 for raid in raids if raid.get("image")),
+    }
+    with report.stage("write"):
+        report.version = publish_output(output_path, raids, args.format)
+        report.output_written = report.version is not None
+    if report.output_written:
+        print(f"Wrote {len(raids)} raids to {output_path}")
+    else:
+        print(f"{len(raids)} raids unchanged in {output_path}")
+    new_state = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "page_hash": page_hash,
+        "recheck_at": next_window_change(data_blob),
+    }
+    write_atomic(state_path, json.dumps(new_state, indent=2) + "\n")
+    report.status = "ok"
     return 0
 
 
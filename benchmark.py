@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+"""Benchmark the web and scraper hot paths and compare runs against a baseline."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+import availableraids
+import raid
+
+SNAPSHOT_SIZES = (10, 100, 1000)
+ROUTES = ("/", "/fire/flying", "/api/raids")
+# Accept-Encoding values for the warm application runs; identity is what a client without one gets.
+ENCODINGS = ("identity", "gzip")
+DEFAULT_THRESHOLD = 0.2
+# Fixed "now" for synthetic pages (2025-01-01T00:00:00Z); the scraper stages never look at the clock.
+SYNTHETIC_PAGE_NOW_MS = 1735689600000
+BOSS_NAMES = ["MEWTWO", "KYOGRE", "GROUDON", "RAYQUAZA", "DIALGA", "PALKIA", "GIRATINA", "DARKRAI"]
+TIERS = ["RAID_LEVEL_5", "RAID_LEVEL_MEGA", "RAID_LEVEL_5_SHADOW", "RAID_LEVEL_1"]
+BOSS_TYPES = [["psychic"], ["water"], ["ground"], ["dragon", "flying"], ["steel", "dragon"], ["water", "dragon"], ["ghost", "dragon"], ["dark"]]
+
+
+def synthetic_raids(count: int, seed: int = 0) -> List[Dict[str, Optional[str]]]:
+    """Scraper-format raids spread over the 3-day window around now."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    raids: List[Dict[str, Optional[str]]] = []
+    for index in range(count):
+        slug = f"{BOSS_NAMES[index % len(BOSS_NAMES)]}_{index}"
+        start = now + timedelta(minutes=rng.randint(-48 * 60, 48 * 60))
+        end = start + timedelta(hours=rng.choice([1, 24, 72]))
+        raids.append({
+            "pokemon": slug.replace("_", " ").title(),
+            "image": f"https://static.pokebattler.com/assets/pokemon/256/pokemon_icon_{index:03d}_00.png",
+            "start_local": None,
+            "end_local": None,
+            "start_utc": start.isoformat(),
+            "end_utc": end.isoformat(),
+            "difficulty": str(rng.randint(1, 6)),
+            "tier": availableraids.humanize_tier(TIERS[index % len(TIERS)]),
+            "tier_raw": TIERS[index % len(TIERS)],
+            "pokebattler_url": f"https://www.pokebattler.com/raids/{slug}",
+            "slug": slug,
+            "types": BOSS_TYPES[index % len(BOSS_TYPES)],
+        })
+    return raids
+
+
+def synthetic_page(raid_count: int, payload_kb: int, seed: int = 0, now_ms: int = SYNTHETIC_PAGE_NOW_MS) -> str:
+    """A page shaped like pokebattler.com/raids: raid table plus a REHYDRATE blob.
+
+    The page only depends on its arguments, so every run parses exactly the same bytes.
+    """
+    rng = random.Random(seed)
+    rows = []
+    store = []
+    for index in range(raid_count):
+        slug = f"{BOSS_NAMES[index % len(BOSS_NAMES)]}_{index}"
+        start_ms = now_ms + rng.randint(-48, 48) * 3600 * 1000
+        store.append({
+            "pokemon": slug,
+            "pokemonId": slug,
+            "tier": TIERS[index % len(TIERS)],
+            "pokemonType1": "POKEMON_TYPE_" + BOSS_TYPES[index % len(BOSS_TYPES)][0].upper(),
+            "pokemonType2": "POKEMON_TYPE_" + BOSS_TYPES[index % len(BOSS_TYPES)][-1].upper(),
+            "startDate": start_ms,
+            "endDate": start_ms + 24 * 3600 * 1000,
+        })
+        rows.append(
+            f'<tr><td><img src="//static.pokebattler.com/assets/pokemon/256/pokemon_icon_{index:03d}_00.png">'
+            f'<a href="/raids/{slug}" title="{slug.title()} Counters">{slug.replace("_", " ").title()}</a></td>'
+            f'<td><span class="veryEasyDifficulty">{rng.randint(1, 6)}</span></td></tr>'
+        )
+    blob = {
+        "raidsStore": {"RAID_LEVEL_5": {"raids": store}},
+        "pokemonStore": {"filler": ["x" * 100] * (payload_kb * 10)},
+    }
+    encoded = quote(json.dumps(blob, separators=(",", ":")), safe="-_.!~*'()")
+    navigation = "<div class='nav'><span>menu</span><a href='/rankings'>Rankings</a></div>" * 500
+    return (
+        '<!DOCTYPE html><html><head><meta property="og:image" content="https://static.pokebattler.com/og.png">'
+        f"</head><body>{navigation}<table><tbody>{''.join(rows)}</tbody></table>"
+        f'<script>window.REHYDRATE=JSON.parse(decodeURIComponent("{encoded}"))</script></body></html>'
+    )
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> float:
+    """Best-of-``repeat`` mean seconds per call, batching calls until a batch is measurable."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return best / number
+
+
+def cpu_per_call(func: Callable[[], object], min_time: float = 0.2) -> float:
+    """Mean process CPU seconds per call over at least ``min_time`` of CPU."""
+    calls = 0
+    started = time.process_time()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.process_time() - started
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def call_application(path_info: str, accept_encoding: str = "") -> bytes:
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path_info, "SCRIPT_NAME": "", "QUERY_STRING": ""}
+    if accept_encoding:
+        environ["HTTP_ACCEPT_ENCODING"] = accept_encoding
+    return b"".join(raid.application(environ, lambda status, headers: None))
+
+
+def uncached(func: Callable[[], object]) -> Callable[[], object]:
+    """Wrap func so every call starts from a cold snapshot, response cache and results memo."""
+    def run() -> object:
+        raid._snapshots.clear()
+        raid.response_cache.clear()
+        raid.RESULTS_CACHE.clear()
+        return func()
+    return run
+
+
+def bench_web(results: Dict[str, Dict[str, float]], workdir: Path, min_time: float) -> None:
+    for size in SNAPSHOT_SIZES:
+        data_path = workdir / f"raids_{size}.json"
+        availableraids.publish_output(data_path, synthetic_raids(size))
+        os.environ["RAID_DATA_PATH"] = str(data_path)
+        now = datetime.now(timezone.utc)
+
+        load = uncached(lambda: raid.load_available_raids(str(data_path)))
+        results[f"load_available_raids[{size}]"] = {
+            "unit": "s", "value": measure(load, min_time), "peak_bytes": peak_memory(load),
+        }
+        raid_list = raid.load_available_raids(str(data_path))
+        render = lambda: raid.render_page("fire", "flying", "", raid_list)  # noqa: E731
+        results[f"render_page[{size}]"] = {
+            "unit": "s", "value": measure(render, min_time), "peak_bytes": peak_memory(render),
+        }
+        render_cold = uncached(render)
+        results[f"render_page[{size}] cold"] = {
+            "unit": "s", "value": measure(render_cold, min_time), "peak_bytes": peak_memory(render_cold),
+        }
+        snapshot = raid.get_raid_snapshot(str(data_path))
+        results[f"status_window[{size}]"] = {
+            "unit": "s", "value": measure(lambda: snapshot.status_window(now), min_time),
+        }
+        for route in ROUTES:
+            for coding in ENCODINGS:
+                warm = lambda: call_application(route, coding)  # noqa: E731
+                results[f"application{route}[{size}] warm {coding}"] = {
+                    "unit": "rps", "value": 1 / measure(warm, min_time),
+                    "wire_bytes": len(warm()), "cpu_s": cpu_per_call(warm, min_time),
+                }
+            cold = uncached(lambda: call_application(route))
+            results[f"application{route}[{size}] cold"] = {
+                "unit": "rps", "value": 1 / measure(cold, min_time), "peak_bytes": peak_memory(cold),
+            }
+
+    pairs = [(type1, type2) for type1 in raid.pokemon_types for type2 in [None] + raid.pokemon_types]
+    results["calculate_effectiveness[all typings]"] = {
+        "unit": "s", "value": measure(lambda: [raid.calculate_effectiveness(*pair) for pair in pairs], min_time),
+    }
+    results["compute_effectiveness[all typings]"] = {
+        "unit": "s", "value": measure(lambda: [raid.compute_effectiveness(*pair) for pair in pairs], min_time),
+    }
+
+
+def bench_scraper(results: Dict[str, Dict[str, float]], pages: Dict[str, str], min_time: float) -> None:
+    def parse_with_html_parser(html: str) -> object:
+        parser = availableraids.RaidLinkParser()
+        parser.feed(html)
+        return parser.results
+
+    stages: Dict[str, Callable[[str], object]] = {
+        "extract_rehydrate_blob": availableraids.extract_rehydrate_blob,
+        "extract_rehydrate_stores": availableraids.extract_rehydrate_stores,
+        "RaidLinkParser": parse_with_html_parser,
+        "scan_page": availableraids.scan_page,
+    }
+    for page_name, html in pages.items():
+        for stage_name, stage in stages.items():
+            run = lambda: stage(html)  # noqa: E731
+            results[f"{stage_name}[{page_name}]"] = {
+                "unit": "s", "value": measure(run, min_time), "peak_bytes": peak_memory(run),
+            }
+
+
+def run_benchmarks(args: argparse.Namespace) -> int:
+    pages = {"synthetic-200x1MB": synthetic_page(200, 1024), "synthetic-50x100KB": synthetic_page(50, 100)}
+    for page_path in args.page or []:
+        pages[Path(page_path).name] = Path(page_path).read_text(encoding="utf-8")
+    results: Dict[str, Dict[str, float]] = {}
+    saved_path = os.environ.get("RAID_DATA_PATH")
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            bench_web(results, Path(workdir), args.min_time)
+        finally:
+            if saved_path is None:
+                os.environ.pop("RAID_DATA_PATH", None)
+            else:
+                os.environ["RAID_DATA_PATH"] = saved_path
+    bench_scraper(results, pages, args.min_time)
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    for name, result in results.items():
+        print(f"{name:55} {format_value(result)}")
+    print(f"Wrote {len(results)} results to {args.output}")
+    return 0
+
+
+def format_value(result: Dict[str, float]) -> str:
+    if result["unit"] == "rps":
+        text = f"{result['value']:12.0f} req/s"
+    else:
+        text = f"{result['value'] * 1000:12.3f} ms   "
+    if "wire_bytes" in result:
+        text += f"  {result['wire_bytes']:8d} B  cpu {result['cpu_s'] * 1e6:8.1f} us"
+    if "peak_bytes" in result:
+        text += f"  peak {result['peak_bytes'] / 1e6:8.2f} MB"
+    return text
+
+
+def compare(args: argparse.Namespace) -> int:
+    """Flag results that got slower (or lower rps) than the baseline by more than the threshold."""
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))["results"]
+    regressions = 0
+    for name, result in current.items():
+        base = baseline.get(name)
+        if not base or base["unit"] != result["unit"] or not base["value"]:
+            print(f"{'new':10} {name}")
+            continue
+        ratio = result["value"] / base["value"]
+        # Positive change means slower: more seconds per call or fewer requests per second.
+        change = (1 / ratio - 1) if result["unit"] == "rps" else (ratio - 1)
+        flag = "REGRESSED" if change > args.threshold else "ok"
+        regressions += flag != "ok"
+        direction = "slower" if change > 0 else "faster"
+        print(f"{flag:10} {name:55} {abs(change) * 100:6.1f}% {direction}")
+    print(f"{regressions} regression(s) over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def record(args: argparse.Namespace) -> int:
+    with availableraids.create_session() as session:
+        html = availableraids.fetch_html(args.url, session=session)
+    Path(args.path).write_text(html, encoding="utf-8")
+    print(f"Recorded {len(html)} characters from {args.url} to {args.path}")
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write a JSON report")
+    run_parser.add_argument("--output", default="benchmark.json", help="Path of the JSON report")
+    run_parser.add_argument("--page", action="append", help="Recorded page to benchmark the scraper stages on")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to spend per measurement")
+    run_parser.set_defaults(func=run_benchmarks)
+
+    compare_parser = commands.add_parser("compare", help="Compare a report against a baseline report")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown before flagging (0.2 = 20%%)"
+    )
+    compare_parser.set_defaults(func=compare)
+
+    record_parser = commands.add_parser("record", help="Save a live page as a benchmark fixture")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--url", default=availableraids.POKEBATTLER_RAIDS_URL)
+    record_parser.set_defaults(func=record)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,5 +21,7 @@ fi
 # Start cron in the background
 cron
 
-# Run the web app as the non-root user
-exec su -s /bin/sh -c "gunicorn -w 2 -b 0.0.0.0:8000 raid:application" appuser
+# Run the web app as the non-root user. gunicorn.conf.py preloads the raid snapshot in the
+# master and recycles the workers whenever the scraper publishes new data, so they keep
+# sharing one copy of it.
+exec su -s /bin/sh -c "gunicorn -c /app/gunicorn.conf.py raid:application" appuser
@@ -0,0 +1,44 @@
+"""Gunicorn settings for raid:application.
+
+The app is preloaded, so workers share the master's parsed raid snapshot copy-on-write.
+When the scraper publishes new data, the master loads it and replaces its workers (the
+same as a SIGHUP), so the new snapshot is shared again instead of every worker parsing
+its own copy.
+"""
+
+import os
+import signal
+import threading
+import time
+
+bind = os.environ.get("RAID_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+preload_app = True
+# Seconds between checks of the shared change counter; 0 disables recycling.
+recycle_interval = float(os.environ.get("RAID_RECYCLE_INTERVAL", "5"))
+
+
+def pre_fork(server, worker):
+    # Runs in the master before every fork: pick up data published since the last one.
+    import raid
+
+    raid.preload()
+
+
+def watch_snapshot(server):
+    import raid
+
+    version = raid.SnapshotVersion(raid.version_file_path(raid.raid_data_path()))
+    seen = version.read()
+    while True:
+        time.sleep(recycle_interval)
+        current = version.read()
+        if current != seen:
+            seen = current
+            server.log.info("Raid data changed (version %s), recycling workers", current)
+            os.kill(server.pid, signal.SIGHUP)
+
+
+def when_ready(server):
+    if recycle_interval > 0:
+        threading.Thread(target=watch_snapshot, args=(server,), name="raid-recycle", daemon=True).start()
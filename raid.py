@@ -1,12 +1,30 @@
 #!/usr/bin/env python3
 
+import argparse
+import asyncio
+import bisect
+import functools
+import gc
+import hashlib
 import html
+import io
 import json
 import math
+import mmap
 import os
-from datetime import datetime, timezone
+import signal
+import string
+import struct
+import sys
+import threading
+import time
+import traceback
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from zoneinfo import ZoneInfo
-from urllib.parse import parse_qs
+from urllib.parse import parse_qs, unquote
 from wsgiref.handlers import CGIHandler
 
 # List of all Pokémon Go types
@@ -44,11 +62,98 @@ type_color_palette = {
     "fairy": {"bg": "#d685ad", "text": "#1f1f1f"}
 }
 
-TYPE_BADGE_STYLES = '\n        '.join([
+TYPE_BADGE_STYLES = '\n'.join([
     f'.type-{ptype} {{ background-color: {cfg["bg"]}; color: {cfg["text"]}; }}'
     for ptype, cfg in type_color_palette.items()
 ])
 
+PAGE_STYLES = '\n'.join([
+    '.type-badge { display: inline-flex; align-items: center; padding: 0.2rem 0.85rem; border-radius: 999px; font-weight: 600; text-transform: capitalize; font-size: 0.95rem; margin: 0 0.35rem 0.35rem 0; }',
+    '.results h1 .type-badge { font-size: inherit; }',
+    '.copy-row { display: flex; gap: 0.5rem; align-items: center; }',
+    '.copy-row textarea { flex: 1; }',
+    '.copy-row button { white-space: nowrap; }',
+    '.raid-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 1rem; }',
+    '.raid-card { padding: 1rem; border: 1px solid #e0e0e0; border-radius: 0.5rem; text-align: center; }',
+    '.raid-card.upcoming { background-color: #f5f5f5; }',
+    '.raid-badge-row { display: flex; justify-content: center; gap: 0.4rem; margin: 0.35rem 0; flex-wrap: wrap; }',
+    '.raid-badge { display: inline-flex; align-items: center; padding: 0.2rem 0.8rem; border-radius: 999px; font-weight: 600; font-size: 0.85rem; text-transform: capitalize; }',
+    '.tier-legendary { background-color: #d4af37; color: #1f1f1f; }',
+    '.tier-shadow { background: linear-gradient(120deg, #2c003e, #5a189a); color: #fff; }',
+    '.tier-mega { background: linear-gradient(120deg, #00acc1, #2ec4b6); color: #fff; }',
+    '.difficulty-easy { background-color: #2e7d32; color: #fff; }',
+    '.difficulty-medium { background-color: #66bb6a; color: #1f1f1f; }',
+    '.difficulty-warning { background-color: #ffeb3b; color: #1f1f1f; }',
+    '.difficulty-hard { background-color: #fb8c00; color: #1f1f1f; }',
+    '.difficulty-extreme { background-color: #c62828; color: #fff; }',
+    '.difficulty-unknown { background-color: #b0bec5; color: #1f1f1f; }',
+    '.raid-card img { margin: 0 auto 0.5rem; }',
+    '.raid-counters { display: block; text-decoration: none; }',
+    TYPE_BADGE_STYLES,
+])
+
+PAGE_SCRIPT = """\
+document.addEventListener('click', async (event) => {
+    const button = event.target.closest('button[data-copy-target]');
+    if (!button) {
+        return;
+    }
+    const targetId = button.getAttribute('data-copy-target');
+    const textarea = document.getElementById(targetId);
+    if (!textarea) {
+        return;
+    }
+    try {
+        await navigator.clipboard.writeText(textarea.value);
+        const originalLabel = button.textContent;
+        button.textContent = 'Copied!';
+        setTimeout(() => {
+            button.textContent = originalLabel;
+        }, 1500);
+    } catch (err) {
+        console.error('Copy failed', err);
+    }
+});
+
+// Navigate to the /type1[/type2] page directly: the static build has no server to turn
+// ?raid_type1=...&raid_type2=... into that redirect.
+const raidForm = document.querySelector('form.raid-form');
+if (raidForm) {
+    raidForm.addEventListener('submit', (event) => {
+        event.preventDefault();
+        const types = [raidForm.elements.raid_type1.value, raidForm.elements.raid_type2.value]
+            .filter((type, index, all) => type && all.indexOf(type) === index);
+        const base = raidForm.getAttribute('action') || '';
+        const path = types.map((type) => `/${encodeURIComponent(type)}`).join('');
+        window.location.assign(base + path || '/');
+    });
+}
+
+const pokebattlerForm = document.getElementById('pokebattler_form');
+const pokebattlerNameInput = document.getElementById('pokebattler_name');
+const pokebattlerQueryField = document.getElementById('pokebattler_query_field');
+if (pokebattlerForm && pokebattlerNameInput && pokebattlerQueryField) {
+    pokebattlerForm.addEventListener('submit', () => {
+        const name = pokebattlerNameInput.value.trim();
+        pokebattlerQueryField.value = name ? `site:pokebattler.com ${name}` : 'site:pokebattler.com';
+    });
+}
+"""
+
+
+def build_static_asset(stem, extension, content, content_type):
+    """Return (versioned file name, asset entry) for content served under /static/."""
+    body = content.encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    entry = {"chunks": [body], "length": len(body), "content_type": content_type, "etag": f'"{digest}"'}
+    return f"{stem}.{digest}.{extension}", entry
+
+
+STATIC_CSS_NAME, _static_css = build_static_asset("raid", "css", PAGE_STYLES + "\n", "text/css; charset=utf-8")
+STATIC_JS_NAME, _static_js = build_static_asset("raid", "js", PAGE_SCRIPT, "text/javascript; charset=utf-8")
+STATIC_ASSETS = {STATIC_CSS_NAME: _static_css, STATIC_JS_NAME: _static_js}
+STATIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
 # Type effectiveness chart
 type_effectiveness = {
     "normal": {"rock": NOT_VERY_EFFECTIVE, "ghost": DOUBLE_NOT_VERY_EFFECTIVE, "steel": NOT_VERY_EFFECTIVE},
@@ -71,14 +176,24 @@ type_effectiveness = {
     "fairy": {"fire": NOT_VERY_EFFECTIVE, "fighting": SUPER_EFFECTIVE, "poison": NOT_VERY_EFFECTIVE, "dragon": SUPER_EFFECTIVE, "dark": SUPER_EFFECTIVE, "steel": NOT_VERY_EFFECTIVE}
 }
 
-# Function to calculate effectiveness for dual-type raid bosses
-def calculate_effectiveness(raid_type1, raid_type2=None):
+# Dense attacker x defender multiplier matrix, indexed in pokemon_types order
+TYPE_INDEX = {ptype: index for index, ptype in enumerate(pokemon_types)}
+EFFECTIVENESS_MATRIX = [
+    [type_effectiveness[attacker].get(defender, NEUTRAL) for defender in pokemon_types]
+    for attacker in pokemon_types
+]
+
+
+def compute_effectiveness(raid_type1, raid_type2=None):
+    """Classify every attacking type against the given defender typing."""
+    column1 = TYPE_INDEX.get(raid_type1)
+    column2 = TYPE_INDEX.get(raid_type2) if raid_type2 else None
     effective_attackers = []
     double_attackers = []
     resisting_attackers = []
-    for attacker, defender_dict in type_effectiveness.items():
-        effectiveness1 = defender_dict.get(raid_type1, NEUTRAL)
-        effectiveness2 = defender_dict.get(raid_type2, NEUTRAL) if raid_type2 else NEUTRAL
+    for attacker, row in zip(pokemon_types, EFFECTIVENESS_MATRIX):
+        effectiveness1 = row[column1] if column1 is not None else NEUTRAL
+        effectiveness2 = row[column2] if column2 is not None else NEUTRAL
         combined_effectiveness = effectiveness1 * effectiveness2
         if combined_effectiveness > NEUTRAL:
             effective_attackers.append(attacker)
@@ -86,17 +201,86 @@ def calculate_effectiveness(raid_type1, raid_type2=None):
             resisting_attackers.append(attacker)
         if combined_effectiveness > DOUBLE_EFFECTIVE_THRESHOLD:
             double_attackers.append(attacker)
-    return (effective_attackers, double_attackers, resisting_attackers)
+    return (tuple(effective_attackers), tuple(double_attackers), tuple(resisting_attackers))
+
+
+# (effective, double, resisting) for every defender typing, keyed on (type1, type2 or None)
+EFFECTIVENESS_TABLE = {
+    (type1, type2): compute_effectiveness(type1, type2)
+    for type1 in pokemon_types
+    for type2 in [None] + pokemon_types
+}
+
+
+# Function to calculate effectiveness for dual-type raid bosses
+def calculate_effectiveness(raid_type1, raid_type2=None):
+    result = EFFECTIVENESS_TABLE.get((raid_type1, raid_type2 or None))
+    if result is None:
+        result = compute_effectiveness(raid_type1, raid_type2)
+    return result
+
+
+def calculate_effectiveness_batch(type_pairs):
+    """Look up many (type1, type2) pairs at once; type2 may be None or empty."""
+    lookup = EFFECTIVENESS_TABLE.get
+    results = []
+    for raid_type1, raid_type2 in type_pairs:
+        result = lookup((raid_type1, raid_type2 or None))
+        if result is None:
+            result = compute_effectiveness(raid_type1, raid_type2)
+        results.append(result)
+    return results
+
+def search_cost(search_string):
+    """Cost model for picking between equivalent search strings: characters to paste and parse."""
+    return len(search_string)
+
+
+def search_string_candidates(effective_attackers):
+    """Every search string compile_search_string chooses from; all match the same Pokémon.
+
+    The charged-move clause can only be written as the positive @2/@3 list. The fast-move clause
+    can also be written as the negated complement (!@1x&!@1y...), since every fast move has one
+    of the 18 types. The positive form comes first.
+    """
+    if not effective_attackers:
+        return [""]
+    attackers = list(effective_attackers)
+    complement = [ptype for ptype in pokemon_types if ptype not in attackers]
+    fast_clauses = [','.join(f"@1{attacker}" for attacker in attackers)]
+    if complement:
+        fast_clauses.append('&'.join(f"!@1{ptype}" for ptype in complement))
+    charged_clause = ','.join(f"@2{attacker},@3{attacker}" for attacker in attackers)
+    candidates = [f"{fast_clause}&{charged_clause}" for fast_clause in fast_clauses]
+    if not complement:
+        # Every fast move qualifies, so the fast-move clause can go.
+        candidates.append(charged_clause)
+    return candidates
+
+
+def compile_search_string(effective_attackers):
+    """Return the cheapest search string matching exactly the attackers whose fast move and at
+    least one charged move are in effective_attackers. Ties keep the positive form.
+    """
+    return min(search_string_candidates(effective_attackers), key=search_cost)
+
 
 # Function to generate search string in the desired format
 def generate_search_string(effective_attackers):
-    if not effective_attackers:
-        return ""
-    part1 = [f"@1{attacker}" for attacker in effective_attackers]
-    part2_and_3 = [f"@2{attacker},@3{attacker}" for attacker in effective_attackers]
-    search_string = f"{','.join(part1)}&{','.join(part2_and_3)}"
+    key = tuple(effective_attackers)
+    search_string = SEARCH_STRINGS.get(key)
+    if search_string is None:
+        search_string = SEARCH_STRINGS[key] = compile_search_string(key)
     return search_string
 
+
+# Compiled search strings for the effective and double effective attackers of every typing.
+SEARCH_STRINGS = {
+    attackers: compile_search_string(attackers)
+    for effective in EFFECTIVENESS_TABLE.values()
+    for attackers in effective[:2]
+}
+
 # Function to generate dropdown HTML
 def generate_dropdown(name, selected_value=None):
     sorted_types = sorted(pokemon_types)
@@ -144,57 +328,314 @@ def parse_local_timestamp(value, local_tz):
         return None
 
 
-def load_available_raids(path=None):
-    data_path = path or os.environ.get("RAID_DATA_PATH") or "/data/available_raids.json"
-    if not os.path.exists(data_path):
-        return []
+def raid_counters(types):
+    """Counter attackers and search strings for a boss typing, or None if it is unknown."""
+    if not types:
+        return None
+    effective_attackers, double_attackers, _ = calculate_effectiveness(types[0], types[1] if len(types) > 1 else None)
+    return {
+        "effective": list(effective_attackers),
+        "double_effective": list(double_attackers),
+        "search_string": generate_search_string(effective_attackers),
+        "double_search_string": generate_search_string(double_attackers),
+    }
+
+
+def raid_data_path(path=None):
+    return path or os.environ.get("RAID_DATA_PATH") or "/data/available_raids.json"
+
+
+def data_file_signature(path):
+    """Return (mtime_ns, inode, size) for the data file, or None when it is missing."""
     try:
-        with open(data_path, "r", encoding="utf-8") as fp:
-            data = json.load(fp)
-    except (OSError, json.JSONDecodeError):
-        return []
-    now = datetime.now(timezone.utc)
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+
+def version_file_path(data_path):
+    """Where availableraids keeps the change counter for data_path (see SnapshotVersion)."""
+    return os.path.splitext(data_path)[0] + '.version'
+
+
+VERSION_STRUCT = struct.Struct('<Q')
+
+
+class SnapshotVersion:
+    """Read-only shared mapping of the 8-byte counter availableraids bumps after each write.
+
+    Every worker maps the same page, so checking for new data costs a memory read instead
+    of a stat() per request. read() returns None while the counter file does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+
+    def read(self):
+        if self._map is None:
+            try:
+                with open(self.path, 'rb') as fp:
+                    self._map = mmap.mmap(fp.fileno(), VERSION_STRUCT.size, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None
+        return VERSION_STRUCT.unpack_from(self._map)[0]
+
+
+def snapshot_file_path(data_path):
+    """Where availableraids writes the compact v2 snapshot for data_path.
+
+    data_path itself keeps the v1 list, which every earlier raid.py can read, so rolling
+    the web app back past the v2 format is safe.
+    """
+    return os.path.splitext(data_path)[0] + '.v2.json'
+
+
+def snapshot_source(data_path):
+    """Return (path, signature) of the file to serve for data_path.
+
+    The v2 snapshot is preferred unless the v1 list is newer, i.e. was last written by a
+    scraper that predates the v2 format.
+    """
+    legacy = data_file_signature(data_path)
+    compact_path = snapshot_file_path(data_path)
+    compact = data_file_signature(compact_path)
+    if compact is not None and (legacy is None or compact[0] >= legacy[0]):
+        return compact_path, compact
+    return data_path, legacy
+
+
+def changelog_path(data_path):
+    """Where availableraids keeps the bounded, versioned log of raid changes for data_path."""
+    return os.path.splitext(data_path)[0] + '.changes.json'
+
+
+def run_report_path(data_path):
+    """Where availableraids writes the report of its last run for data_path."""
+    return os.path.splitext(data_path)[0] + '.report.json'
+
+
+def source_timezone():
     # Timestamps from the source site appear to use California time; default to that unless overridden.
     source_tz_name = os.environ.get("RAID_SOURCE_TZ", "America/Los_Angeles")
     try:
-        local_tz = ZoneInfo(source_tz_name)
+        return ZoneInfo(source_tz_name)
     except Exception:
-        local_tz = ZoneInfo("UTC")
-    active = []
-    upcoming = []
-    for raid in data:
-        tier_label = raid.get("tier_raw") or raid.get("tier", "")
-        if not is_tier_five_or_higher(tier_label):
-            continue
-        start = parse_timestamp(raid.get("start_utc"))
-        end = parse_timestamp(raid.get("end_utc"))
-        # Prefer local timestamps if provided, converting to UTC for consistent comparison.
-        start_local = parse_local_timestamp(raid.get("start_local"), local_tz)
-        end_local = parse_local_timestamp(raid.get("end_local"), local_tz)
-        if start_local:
-            start = start_local.astimezone(timezone.utc)
-        if end_local:
-            end = end_local.astimezone(timezone.utc)
-        diff_text, diff_value = format_difficulty_label(raid.get("difficulty"))
-        if end and end < now:
-            continue
-        entry = {
-            "pokemon": raid.get("pokemon", "Unknown"),
-            "image": raid.get("image"),
-            "url": raid.get("pokebattler_url"),
-            "tier": humanize_tier_label(tier_label or raid.get("tier", "")),
-            "tier_class": classify_tier_badge(tier_label or raid.get("tier", "")),
-            "start": start,
-            "end": end,
-            "status": humanize_schedule(now, start, end),
-            "difficulty": diff_text,
-            "difficulty_level": diff_value,
-            "state": "active" if start and start <= now else "upcoming"
-        }
-        (active if entry["state"] == "active" else upcoming).append(entry)
-    active.sort(key=lambda item: item.get("end") or datetime.max.replace(tzinfo=timezone.utc))
-    upcoming.sort(key=lambda item: item.get("start") or datetime.max.replace(tzinfo=timezone.utc))
-    return active + upcoming
+        return ZoneInfo("UTC")
+
+
+# Version of the compact snapshot written by availableraids.publish_output
+SNAPSHOT_FORMAT = 2
+# Compact snapshots store tier_class as an index into this tuple
+TIER_CLASSES = ("tier-legendary", "tier-shadow", "tier-mega")
+
+
+def resolve_raid(raid, local_tz):
+    """Resolve one scraper-format raid entry, or return None when it is below tier 5."""
+    tier_label = raid.get("tier_raw") or raid.get("tier", "")
+    if not is_tier_five_or_higher(tier_label):
+        return None
+    start = parse_timestamp(raid.get("start_utc"))
+    end = parse_timestamp(raid.get("end_utc"))
+    # Prefer local timestamps if provided, converting to UTC for consistent comparison.
+    start_local = parse_local_timestamp(raid.get("start_local"), local_tz)
+    end_local = parse_local_timestamp(raid.get("end_local"), local_tz)
+    if start_local:
+        start = start_local.astimezone(timezone.utc)
+    if end_local:
+        end = end_local.astimezone(timezone.utc)
+    diff_text, diff_value = format_difficulty_label(raid.get("difficulty"))
+    types = [ptype for ptype in (normalize_type(value) for value in raid.get("types") or []) if ptype]
+    return {
+        "slug": raid.get("slug") or (raid.get("pokebattler_url") or "").rstrip("/").rsplit("/", 1)[-1],
+        "types": types,
+        "counters": raid_counters(types),
+        "pokemon": raid.get("pokemon", "Unknown"),
+        "image": raid.get("image"),
+        "url": raid.get("pokebattler_url"),
+        "tier": humanize_tier_label(tier_label or raid.get("tier", "")),
+        "tier_class": classify_tier_badge(tier_label or raid.get("tier", "")),
+        "start": start,
+        "end": end,
+        "difficulty": diff_text,
+        "difficulty_level": diff_value,
+    }
+
+
+def compact_raid(resolved):
+    """Encode a resolve_raid result for the compact snapshot format."""
+    difficulty = resolved["difficulty_level"] if resolved["difficulty_level"] is not None else resolved["difficulty"]
+    return {
+        "slug": resolved["slug"],
+        "types": resolved["types"],
+        "counters": resolved["counters"],
+        "pokemon": resolved["pokemon"],
+        "image": resolved["image"],
+        "url": resolved["url"],
+        "tier": resolved["tier"],
+        "tier_class": TIER_CLASSES.index(resolved["tier_class"]),
+        "start": int(resolved["start"].timestamp()) if resolved["start"] else None,
+        "end": int(resolved["end"].timestamp()) if resolved["end"] else None,
+        "difficulty": difficulty or None,
+    }
+
+
+def resolve_compact_raid(raid):
+    diff_text, diff_value = format_difficulty_label(raid.get("difficulty"))
+    start = raid.get("start")
+    end = raid.get("end")
+    types = raid.get("types") or []
+    return {
+        "slug": raid.get("slug") or "",
+        "types": types,
+        # Snapshots written before counters were precomputed get them here.
+        "counters": raid.get("counters") or raid_counters(types),
+        "pokemon": raid.get("pokemon", "Unknown"),
+        "image": raid.get("image"),
+        "url": raid.get("url"),
+        "tier": raid.get("tier", ""),
+        "tier_class": TIER_CLASSES[raid.get("tier_class") or 0],
+        "start": datetime.fromtimestamp(start, tz=timezone.utc) if start is not None else None,
+        "end": datetime.fromtimestamp(end, tz=timezone.utc) if end is not None else None,
+        "difficulty": diff_text,
+        "difficulty_level": diff_value,
+    }
+
+
+class RaidSnapshot:
+    """Parsed raid data file with everything but the time-dependent fields resolved."""
+
+    def __init__(self, path, signature, raids, version="", change_version=None):
+        self.path = path
+        self.signature = signature
+        self.version = version
+        # Change counter value the scraper stamped into the file (v2 only).
+        self.change_version = change_version
+        self.modified = datetime.fromtimestamp(signature[0] // 10**9, tz=timezone.utc) if signature else None
+        self.raids = raids
+        far_future = datetime.max.replace(tzinfo=timezone.utc)
+        # Stable pre-sorts so raids_at only has to filter.
+        self._by_end = sorted(raids, key=lambda item: item.get("end") or far_future)
+        self._by_start = sorted(raids, key=lambda item: item.get("start") or far_future)
+        self._window = None
+        self._raid_sections = {}
+        self.counter = None
+        self.checked = 0.0
+
+    @classmethod
+    def load(cls, path, signature):
+        if signature is None:
+            return cls(path, None, [])
+        try:
+            with open(path, "rb") as fp:
+                raw = fp.read()
+            data = json.loads(raw)
+        except (OSError, ValueError):
+            return cls(path, signature, [])
+        change_version = None
+        if isinstance(data, dict) and data.get("format") == SNAPSHOT_FORMAT:
+            raids = [resolve_compact_raid(raid) for raid in data.get("raids", [])]
+            change_version = data.get("version")
+        elif isinstance(data, list):
+            local_tz = source_timezone()
+            raids = [resolved for resolved in (resolve_raid(raid, local_tz) for raid in data) if resolved]
+        else:
+            raids = []
+        return cls(path, signature, raids, hashlib.sha1(raw).hexdigest()[:16], change_version)
+
+    def raids_at(self, now):
+        """Return active raids (soonest ending first) followed by upcoming ones."""
+        active = [
+            dict(raid, status=humanize_schedule(now, raid["start"], raid["end"]), state="active")
+            for raid in self._by_end
+            if raid["start"] and raid["start"] <= now and not (raid["end"] and raid["end"] < now)
+        ]
+        upcoming = [
+            dict(raid, status=humanize_schedule(now, raid["start"], raid["end"]), state="upcoming")
+            for raid in self._by_start
+            if not (raid["start"] and raid["start"] <= now) and not (raid["end"] and raid["end"] < now)
+        ]
+        return active + upcoming
+
+    def status_window(self, now):
+        """Return (last, next) change moments across all raids, including ones that already ended.
+
+        Nothing changes in between, so the window is reused until now leaves it.
+        """
+        window = self._window
+        if window and (window[0] is None or window[0] <= now) and (window[1] is None or now < window[1]):
+            return window
+        last_change = None
+        next_change = None
+        for raid in self.raids:
+            last, upcoming = schedule_window(now, raid["start"], raid["end"])
+            if last and (last_change is None or last > last_change):
+                last_change = last
+            if upcoming and (next_change is None or upcoming < next_change):
+                next_change = upcoming
+        self._window = (last_change, next_change)
+        return self._window
+
+    def raid_section(self, now, script_name=''):
+        """Return the encoded raid grid shared by every page, re-rendered once per status window."""
+        window = self.status_window(now)
+        cached = self._raid_sections.get(script_name)
+        if cached is None or cached[0] != window:
+            section = render_raid_section(self.raids_at(now), script_name).encode('utf-8')
+            cached = self._raid_sections[script_name] = (window, section)
+        return cached[1]
+
+
+_snapshots = {}
+_versions = {}
+# Even with an unchanged counter, stat the data file this often to catch edits made by hand.
+SNAPSHOT_RECHECK = float(os.environ.get("RAID_SNAPSHOT_RECHECK", "5"))
+
+
+def get_raid_snapshot(path=None):
+    """Return the snapshot for the data file, re-reading it only when its mtime, inode or size changed.
+
+    The file actually read is the one snapshot_source picks for the data path. While the
+    shared change counter is unchanged the stat() is skipped for up to SNAPSHOT_RECHECK seconds.
+    """
+    data_path = raid_data_path(path)
+    version = _versions.get(data_path)
+    if version is None:
+        version = _versions[data_path] = SnapshotVersion(version_file_path(data_path))
+    counter = version.read()
+    snapshot = _snapshots.get(data_path)
+    checked = time.monotonic()
+    if (
+        snapshot is not None and counter is not None and counter == snapshot.counter
+        and checked - snapshot.checked < SNAPSHOT_RECHECK
+    ):
+        return snapshot
+    source, signature = snapshot_source(data_path)
+    if snapshot is None or snapshot.path != source or snapshot.signature != signature:
+        snapshot = RaidSnapshot.load(source, signature)
+        _snapshots[data_path] = snapshot
+    snapshot.counter = counter
+    snapshot.checked = checked
+    return snapshot
+
+
+def preload(path=None):
+    """Load the snapshot and freeze everything built so far before gunicorn forks its workers.
+
+    With gunicorn --preload the workers then share these pages copy-on-write, and gc.freeze()
+    keeps the collector from touching (and so copying) them.
+
+    Only the snapshot loaded here is shared, so gunicorn.conf.py calls this before every
+    fork and replaces the workers when the scraper publishes new data; a worker left running
+    would otherwise parse and keep its own copy of each new snapshot.
+    """
+    get_raid_snapshot(path)
+    gc.freeze()
+
+
+def load_available_raids(path=None, now=None):
+    return get_raid_snapshot(path).raids_at(now or datetime.now(timezone.utc))
 
 
 def parse_timestamp(value):
@@ -243,6 +684,26 @@ def humanize_schedule(now, start, end):
     return "Schedule unknown"
 
 
+def schedule_window(now, start, end):
+    """Return (last, next) moments around now at which a raid's status text or state changes.
+
+    Either bound may be None when there is no such moment.
+    """
+    passed = [moment for moment in (start, end) if moment and moment <= now]
+    last = max(passed) if passed else None
+    if start and start > now:
+        target = start
+    elif end and end > now:
+        target = end
+    else:
+        return last, None
+    remaining = (target - now).total_seconds()
+    period = 86400 if remaining > 86400 else 3600
+    steps = math.ceil(remaining / period)
+    previous = target - timedelta(seconds=steps * period)
+    return max(last, previous) if last else previous, target - timedelta(seconds=(steps - 1) * period)
+
+
 def humanize_tier_label(tier_label):
     label = (tier_label or "").upper()
     if "SHADOW" in label:
@@ -304,9 +765,658 @@ def difficulty_class(level):
     return "difficulty-extreme"
 
 
+class ResponseCache:
+    """Bounded LRU of rendered response entries with per-entry expiry."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.get("expires") and now >= entry["expires"]:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+response_cache = ResponseCache(int(os.environ.get("RAID_RESPONSE_CACHE_SIZE", "256")))
+
+# Upper bound for Cache-Control max-age; the data file itself can change at any time.
+MAX_AGE = int(os.environ.get("RAID_MAX_AGE", "3600"))
+
+
+# Bodies smaller than this are sent uncompressed; the gzip framing would eat the gain.
+COMPRESS_MIN_SIZE = 1024
+# zlib window bits: 31 writes a gzip container (mtime 0), 15 the zlib-wrapped "deflate" one.
+COMPRESSORS = {"gzip": 31, "deflate": 15}
+
+
+def compress_chunks(chunks, wbits):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+    return b''.join([compressor.compress(chunk) for chunk in chunks] + [compressor.flush()])
+
+
+def negotiate_encoding(environ):
+    """Pick gzip or deflate from Accept-Encoding, or None for identity."""
+    accepted = {}
+    for item in environ.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    for coding in COMPRESSORS:
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def entry_encoding(entry, encoding):
+    """The coding a cache entry is actually sent with: None below COMPRESS_MIN_SIZE."""
+    if not encoding or entry["length"] < COMPRESS_MIN_SIZE:
+        return None
+    return encoding
+
+
+def encoded_body(entry, encoding):
+    """Return (chunks, length, encoding) for a cache entry, compressing each variant once."""
+    encoding = entry_encoding(entry, encoding)
+    if not encoding:
+        return entry["chunks"], entry["length"], None
+    variants = entry.setdefault("variants", {})
+    compressed = variants.get(encoding)
+    if compressed is None:
+        compressed = variants[encoding] = compress_chunks(entry["chunks"], COMPRESSORS[encoding])
+    return [compressed], len(compressed), encoding
+
+
+def variant_etag(etag, encoding):
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def make_etag(*parts):
+    """Strong validator for parts, scoped to the running build (see BUILD_FINGERPRINT)."""
+    return '"' + hashlib.sha1(repr((BUILD_FINGERPRINT,) + parts).encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def caching_headers(now, etag, last_modified, next_change):
+    max_age = MAX_AGE
+    if next_change:
+        max_age = max(0, min(max_age, int((next_change - now).total_seconds())))
+    headers = [('ETag', etag), ('Cache-Control', f'public, max-age={max_age}'), ('Vary', 'Accept-Encoding')]
+    if last_modified:
+        headers.append(('Last-Modified', formatdate(last_modified.timestamp(), usegmt=True)))
+    return headers
+
+
+def is_not_modified(environ, etags, last_modified):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if '*' in tags:
+            return True
+        return any(etag in tags or f'W/{etag}' in tags for etag in etags)
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+METRICS_ENABLED = os.environ.get("RAID_METRICS", "1") != "0"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class RequestTimer:
+    """Stage durations of one request, collected via record_stage."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.total = None
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        return self.total
+
+    def server_timing(self):
+        stages = self.stages + [('total', self.finish())]
+        return ', '.join(f'{name};dur={duration * 1000:.3f}' for name, duration in stages)
+
+
+def record_stage(environ, name, started):
+    timer = environ.get('raid.timer')
+    if timer is not None:
+        timer.stages.append((name, time.perf_counter() - started))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """Per-process request counters and latency histograms in Prometheus text format."""
+
+    def __init__(self):
+        self.requests = {}
+        self.cache_results = {}
+        self.durations = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, status, cache_status, timer):
+        with self._lock:
+            key = (route, status[:3])
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if cache_status:
+                key = (route, cache_status.lower())
+                self.cache_results[key] = self.cache_results.get(key, 0) + 1
+            if route not in self.durations:
+                self.durations[route] = Histogram()
+            self.durations[route].observe(timer.total)
+            for name, duration in timer.stages:
+                if name not in self.stages:
+                    self.stages[name] = Histogram()
+                self.stages[name].observe(duration)
+
+    def render(self, snapshot, age, cache_stats):
+        lines = [
+            '# HELP raid_requests_total Requests handled, by route and status code.',
+            '# TYPE raid_requests_total counter',
+        ]
+        with self._lock:
+            for (route, code), count in sorted(self.requests.items()):
+                lines.append(f'raid_requests_total{{route="{route}",code="{code}"}} {count}')
+            lines += [
+                '# HELP raid_request_duration_seconds Time until the response headers were ready, by route.',
+                '# TYPE raid_request_duration_seconds histogram',
+            ]
+            for route, histogram in sorted(self.durations.items()):
+                lines += histogram.render('raid_request_duration_seconds', f'route="{route}"')
+            lines += [
+                '# HELP raid_stage_duration_seconds Time spent per request stage (snapshot, render, compress).',
+                '# TYPE raid_stage_duration_seconds histogram',
+            ]
+            for stage, histogram in sorted(self.stages.items()):
+                lines += histogram.render('raid_stage_duration_seconds', f'stage="{stage}"')
+            lines += [
+                '# HELP raid_response_cache_requests_total Response cache lookups, by route and result.',
+                '# TYPE raid_response_cache_requests_total counter',
+            ]
+            for (route, result), count in sorted(self.cache_results.items()):
+                lines.append(f'raid_response_cache_requests_total{{route="{route}",result="{result}"}} {count}')
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        lines += [
+            '# HELP raid_response_cache_hit_ratio Share of response cache lookups served from the cache.',
+            '# TYPE raid_response_cache_hit_ratio gauge',
+            f'raid_response_cache_hit_ratio {cache_stats["hits"] / lookups if lookups else 0:.6f}',
+            '# HELP raid_response_cache_entries Rendered responses currently cached.',
+            '# TYPE raid_response_cache_entries gauge',
+            f'raid_response_cache_entries {cache_stats["size"]}',
+            '# HELP raid_snapshot_raids Tier 5+ raids in the loaded raid snapshot.',
+            '# TYPE raid_snapshot_raids gauge',
+            f'raid_snapshot_raids {len(snapshot.raids)}',
+        ]
+        if age is not None:
+            lines += [
+                '# HELP raid_snapshot_age_seconds Seconds since the raid data was last refreshed (as /healthz reports it).',
+                '# TYPE raid_snapshot_age_seconds gauge',
+                f'raid_snapshot_age_seconds {age:.0f}',
+            ]
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+metrics = Metrics()
+
+
+@functools.lru_cache(maxsize=1024)
+def route_label(path_info):
+    """Map a request path onto a small, fixed set of metric labels (memoized per path)."""
+    parts = [part for part in path_info.split('/') if part]
+    if not parts:
+        return 'index'
+    if parts[0] in ('static', 'metrics', 'healthz'):
+        return parts[0]
+    if parts[0] == 'api':
+        return 'api_' + parts[1] if len(parts) > 1 and parts[1] in ('raids', 'counters') else 'api_other'
+    return 'counters' if normalize_type(parts[0]) else 'other'
+
+
+def metrics_response(start_response):
+    if not METRICS_ENABLED:
+        return not_found(start_response)
+    snapshot = get_raid_snapshot()
+    age = snapshot_age(datetime.now(timezone.utc), snapshot, load_run_report(raid_data_path()))
+    body = metrics.render(snapshot, age, response_cache.stats())
+    start_response('200 OK', [
+        ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+        ('Content-Length', str(len(body))),
+        ('Cache-Control', 'no-store'),
+    ])
+    return [body]
+
+
+# The scraper runs daily; a snapshot not refreshed for longer than this fails /healthz.
+STALE_AFTER = int(os.environ.get("RAID_STALE_AFTER", str(26 * 60 * 60)))
+SUCCESSFUL_RUN_STATUSES = ("ok", "unchanged", "not_modified")
+
+
+def load_run_report(data_path):
+    try:
+        with open(run_report_path(data_path), encoding='utf-8') as fp:
+            report = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    return report if isinstance(report, dict) else None
+
+
+def snapshot_age(now, snapshot, report):
+    """Seconds since the raid data was last refreshed, or None if it never was.
+
+    Unchanged upstream data leaves the data file's mtime alone, so a successful run
+    counts as a refresh too.
+    """
+    refreshed = [snapshot.modified] if snapshot.modified else []
+    if report is not None and report.get("status") in SUCCESSFUL_RUN_STATUSES:
+        finished_at = parse_timestamp(report.get("finished_at"))
+        if finished_at:
+            refreshed.append(finished_at)
+    return (now - max(refreshed)).total_seconds() if refreshed else None
+
+
+def health_payload(now, snapshot, report):
+    """Return (healthy, payload); healthy only depends on snapshot_age.
+
+    A failed last run or a missing data file is reported in the payload but is not
+    unhealthy by itself: the site keeps serving what it has until that goes stale.
+    """
+    last_run = None
+    if report is not None:
+        last_run = {key: report.get(key) for key in ("status", "finished_at", "duration_seconds")}
+        last_run["errors"] = len(report.get("errors") or [])
+    age = snapshot_age(now, snapshot, report)
+    healthy = age is not None and age <= STALE_AFTER
+    payload = {
+        "status": "ok" if healthy else "stale",
+        "snapshot_age_seconds": None if age is None else int(age),
+        "stale_after_seconds": STALE_AFTER,
+        "data_file": "present" if snapshot.signature is not None else "missing",
+        "raids": len(snapshot.raids),
+        "last_run": last_run,
+    }
+    return healthy, payload
+
+
+def healthz_response(start_response):
+    snapshot = get_raid_snapshot()
+    healthy, payload = health_payload(datetime.now(timezone.utc), snapshot, load_run_report(raid_data_path()))
+    body = encode_json(payload)
+    start_response('200 OK' if healthy else '503 Service Unavailable', [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+        ('Cache-Control', 'no-store'),
+    ])
+    return [body]
+
+
+def not_found(start_response):
+    body = b'Not Found'
+    start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def serve_static(environ, start_response, name):
+    asset = STATIC_ASSETS.get(name)
+    if asset is None:
+        return not_found(start_response)
+    encoding = negotiate_encoding(environ)
+    etag = variant_etag(asset["etag"], encoding)
+    headers = [('ETag', etag), ('Cache-Control', STATIC_CACHE_CONTROL), ('Vary', 'Accept-Encoding')]
+    if is_not_modified(environ, [asset["etag"], etag], None):
+        start_response('304 Not Modified', headers)
+        return [b'']
+    chunks, length, encoding = encoded_body(asset, encoding)
+    headers = [('Content-Type', asset["content_type"]), ('Content-Length', str(length))] + headers
+    if encoding:
+        headers.append(('Content-Encoding', encoding))
+    start_response('200 OK', headers)
+    return chunks
+
+
+def cached_response(environ, start_response, cache_key, content_type, render, snapshot=None):
+    """Serve render(now) through the response cache with conditional GET and compression.
+
+    render returns bytes or a list of byte chunks. Responses built from a snapshot expire
+    with its next status change; without one they only depend on cache_key.
+    """
+    now = datetime.now(timezone.utc)
+    version = last_change = next_change = last_modified = None
+    if snapshot is not None:
+        version = snapshot.version
+        last_change, next_change = snapshot.status_window(now)
+        last_modified = max([moment for moment in (snapshot.modified, last_change, BUILD_TIME) if moment])
+    etag = make_etag(*cache_key, version, last_change)
+
+    # The entry is looked up before answering a conditional request: whether the body
+    # goes out compressed, and so which ETag the 200 carried, depends on its length.
+    cache_key = cache_key + (version,)
+    entry = response_cache.get(cache_key, now)
+    cache_status = 'HIT'
+    if entry is None:
+        cache_status = 'MISS'
+        started = time.perf_counter()
+        body = render(now)
+        chunks = body if isinstance(body, list) else [body]
+        entry = {"chunks": chunks, "length": sum(map(len, chunks)), "expires": next_change}
+        record_stage(environ, 'render', started)
+        response_cache.put(cache_key, entry)
+
+    encoding = entry_encoding(entry, negotiate_encoding(environ))
+    if is_not_modified(environ, [etag, variant_etag(etag, encoding)], last_modified):
+        start_response('304 Not Modified', caching_headers(now, variant_etag(etag, encoding), last_modified, next_change))
+        return [b'']
+
+    # Only a request that actually compresses a new variant records the stage.
+    compressing = encoding is not None and encoding not in entry.get("variants", ())
+    started = time.perf_counter()
+    chunks, length, encoding = encoded_body(entry, encoding)
+    if compressing:
+        record_stage(environ, 'compress', started)
+    headers = [
+        ('Content-Type', content_type),
+        ('Content-Length', str(length)),
+        ('X-Cache', cache_status),
+    ]
+    if encoding:
+        headers.append(('Content-Encoding', encoding))
+    start_response('200 OK', headers + caching_headers(now, variant_etag(etag, encoding), last_modified, next_change))
+    return chunks
+
+
+def json_response(start_response, status, payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def counters_payload(raid_type1, raid_type2=''):
+    effective_attackers, double_attackers, resisting_attackers = calculate_effectiveness(raid_type1, raid_type2 or None)
+    return {
+        "types": [raid_type1] + ([raid_type2] if raid_type2 else []),
+        "effective": list(effective_attackers),
+        "double_effective": list(double_attackers),
+        "resisting": list(resisting_attackers),
+        "search_string": generate_search_string(effective_attackers),
+        "double_search_string": generate_search_string(double_attackers),
+    }
+
+
+def raid_fields(raid):
+    """JSON fields of a resolved raid that do not depend on the current time."""
+    return {
+        "slug": raid["slug"],
+        "pokemon": raid["pokemon"],
+        "image": raid["image"],
+        "url": raid["url"],
+        "tier": raid["tier"],
+        "tier_class": raid["tier_class"],
+        "start": raid["start"].isoformat() if raid["start"] else None,
+        "end": raid["end"].isoformat() if raid["end"] else None,
+        "difficulty": raid["difficulty"],
+        "difficulty_level": raid["difficulty_level"],
+        "types": raid["types"],
+        "counters": raid["counters"],
+    }
+
+
+def raids_payload(raid_list):
+    return [dict(raid_fields(raid), status=raid["status"], state=raid["state"]) for raid in raid_list]
+
+
+_changelogs = {}
+
+
+def load_changelog(data_path):
+    """Return the changelog entries for data_path, re-reading the file only when it changed."""
+    path = changelog_path(data_path)
+    signature = data_file_signature(path)
+    cached = _changelogs.get(path)
+    if cached is None or cached[0] != signature:
+        try:
+            with open(path, encoding='utf-8') as fp:
+                entries = json.load(fp).get("entries", [])
+        except (OSError, ValueError, AttributeError):
+            entries = []
+        cached = _changelogs[path] = (signature, entries)
+    return cached[1]
+
+
+def changes_payload(entries, since):
+    """Changes after version since, or a resync marker when the log no longer reaches back that far."""
+    version = entries[-1]["version"] if entries else None
+    if version is None or since > version or since < entries[0]["version"] - 1:
+        return {"version": version, "resync": True}
+    return {
+        "version": version,
+        "changes": [
+            {
+                "version": entry["version"],
+                "added": [raid_fields(resolve_compact_raid(raid)) for raid in entry.get("added", [])],
+                "updated": [raid_fields(resolve_compact_raid(raid)) for raid in entry.get("updated", [])],
+                "removed": entry.get("removed", []),
+            }
+            for entry in entries
+            if entry["version"] > since
+        ],
+    }
+
+
+def encode_json(payload):
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+# Upper bounds for POST /api/counters
+MAX_BATCH_SIZE = 100
+MAX_BATCH_BYTES = 64 * 1024
+
+
+def resolve_batch_item(item, bosses):
+    """Return ((type1, type2), error) for a [type1, type2] list or a boss slug.
+
+    The pair comes back in pokemon_types order, so both orders of a dual typing share one
+    counters entry.
+    """
+    if isinstance(item, str):
+        raid_types = bosses.get(item.strip().upper())
+        if raid_types is None:
+            return None, "unknown boss"
+        if not raid_types:
+            return None, "boss typing unavailable"
+    elif isinstance(item, list) and 1 <= len(item) <= 2 and all(isinstance(value, str) for value in item):
+        raid_types = [normalize_type(value) for value in item]
+        if not all(raid_types):
+            return None, "unknown type"
+    else:
+        return None, "expected [type1, type2] or a boss slug"
+    raid_type1, *rest = sorted(set(raid_types), key=TYPE_INDEX.get)
+    return (raid_type1, rest[0] if rest else ''), None
+
+
+def batch_counters(environ, start_response):
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        return json_response(start_response, '400 Bad Request', {"error": "invalid Content-Length"})
+    if length > MAX_BATCH_BYTES:
+        return json_response(start_response, '413 Payload Too Large', {"error": "request body too large"})
+    try:
+        # Never trust the declared length alone for how much to pull off the input.
+        body = environ['wsgi.input'].read(min(length, MAX_BATCH_BYTES + 1))
+    except KeyError:
+        body = b''
+    if len(body) > MAX_BATCH_BYTES:
+        return json_response(start_response, '413 Payload Too Large', {"error": "request body too large"})
+    try:
+        items = json.loads(body or b'null')
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        return json_response(start_response, '400 Bad Request', {"error": "expected a JSON array"})
+    if len(items) > MAX_BATCH_SIZE:
+        return json_response(start_response, '413 Payload Too Large', {"error": f"at most {MAX_BATCH_SIZE} items per batch"})
+
+    bosses = {}
+    if any(isinstance(item, str) for item in items):
+        for raid in get_raid_snapshot().raids:
+            if raid["slug"]:
+                bosses[raid["slug"].upper()] = raid["types"]
+    results = []
+    counters = {}
+    for item in items:
+        pair, error = resolve_batch_item(item, bosses)
+        if error:
+            results.append({"query": item, "error": error})
+            continue
+        key = '/'.join(ptype for ptype in pair if ptype)
+        if key not in counters:
+            counters[key] = counters_payload(*pair)
+        results.append({"query": item, "counters": key})
+    return json_response(start_response, '200 OK', {"results": results, "counters": counters})
+
+
+def api_application(environ, start_response, path_info):
+    parts = [part for part in path_info.split('/') if part]
+    if parts == ['counters']:
+        if environ.get('REQUEST_METHOD', 'GET').upper() != 'POST':
+            start_response('405 Method Not Allowed', [('Allow', 'POST'), ('Content-Length', '0')])
+            return [b'']
+        return batch_counters(environ, start_response)
+    if parts == ['raids']:
+        since = parse_qs(environ.get('QUERY_STRING', '')).get('since')
+        if since:
+            try:
+                since = int(since[0])
+            except ValueError:
+                return json_response(start_response, '400 Bad Request', {"error": "since must be an integer version"})
+            return json_response(start_response, '200 OK', changes_payload(load_changelog(raid_data_path()), since))
+        started = time.perf_counter()
+        snapshot = get_raid_snapshot()
+        record_stage(environ, 'snapshot', started)
+        # The version comes from the data file itself, not the live counter, so the body
+        # always pairs the raids with the version they were published under.
+        change_version = snapshot.change_version
+        return cached_response(
+            environ, start_response, ('api-raids', change_version), 'application/json',
+            lambda now: encode_json({"version": change_version, "raids": raids_payload(snapshot.raids_at(now))}),
+            snapshot,
+        )
+    if parts and parts[0] == 'counters' and 2 <= len(parts) <= 3:
+        raid_types = [normalize_type(part) for part in parts[1:]]
+        if not all(raid_types):
+            return json_response(start_response, '404 Not Found', {"error": "unknown type"})
+        raid_type1 = raid_types[0]
+        raid_type2 = raid_types[1] if len(raid_types) > 1 and raid_types[1] != raid_type1 else ''
+        return cached_response(
+            environ, start_response, ('api-counters', raid_type1, raid_type2), 'application/json',
+            lambda now: encode_json(counters_payload(raid_type1, raid_type2)),
+        )
+    return json_response(start_response, '404 Not Found', {"error": "not found"})
+
+
 def application(environ, start_response):
+    """WSGI entry point: route the request and, unless RAID_METRICS=0, time it.
+
+    Stage timings go into the /metrics histograms and, when any stage was recorded,
+    out as a Server-Timing header.
+    """
+    if not METRICS_ENABLED:
+        return route_request(environ, start_response)
+    timer = environ['raid.timer'] = RequestTimer()
+    response = {}
+
+    def timed_start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['cache'] = next((value for name, value in headers if name == 'X-Cache'), None)
+        if timer.stages:
+            headers = list(headers) + [('Server-Timing', timer.server_timing())]
+        if exc_info:
+            return start_response(status, headers, exc_info)
+        return start_response(status, headers)
+
+    body = route_request(environ, timed_start_response)
+    if timer.total is None:
+        timer.finish()
+    metrics.observe(route_label(environ.get('PATH_INFO', '')), response.get('status', '500'), response.get('cache'), timer)
+    return body
+
+
+def route_request(environ, start_response):
     params = parse_qs(environ.get('QUERY_STRING', ''), keep_blank_values=True)
     path_info = environ.get('PATH_INFO', '').strip('/')
+    if path_info == 'metrics':
+        return metrics_response(start_response)
+    if path_info == 'healthz':
+        return healthz_response(start_response)
+    if path_info.startswith('static/'):
+        return serve_static(environ, start_response, path_info[len('static/'):])
+    if path_info.startswith('api/'):
+        return api_application(environ, start_response, path_info[len('api/'):])
     path_parts = [normalize_type(part) for part in path_info.split('/') if part]
     raid_type1 = path_parts[0] if path_parts else ''
     raid_type2 = path_parts[1] if len(path_parts) > 1 else ''
@@ -328,114 +1438,113 @@ def application(environ, start_response):
     elif raid_type1 and raid_type2 and raid_type1 == raid_type2:
         raid_type2 = ''
 
-    body_parts = [
-        '<!DOCTYPE html>',
-        '<html lang="en">',
-        '<head>',
-        '    <meta charset="utf-8">',
-        '    <meta name="viewport" content="width=device-width, initial-scale=1.0">',
-        '    <title>Pokémon Go Raid Helper</title>',
-        '    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/@picocss/pico@2/css/pico.min.css">',
-        '    <style>',
-        '        .type-badge { display: inline-flex; align-items: center; padding: 0.2rem 0.85rem; border-radius: 999px; font-weight: 600; text-transform: capitalize; font-size: 0.95rem; margin: 0 0.35rem 0.35rem 0; }',
-        '        .results h1 .type-badge { font-size: inherit; }',
-        '        .copy-row { display: flex; gap: 0.5rem; align-items: center; }',
-        '        .copy-row textarea { flex: 1; }',
-        '        .copy-row button { white-space: nowrap; }',
-        '        .raid-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 1rem; }',
-        '        .raid-card { padding: 1rem; border: 1px solid #e0e0e0; border-radius: 0.5rem; text-align: center; }',
-        '        .raid-card.upcoming { background-color: #f5f5f5; }',
-        '        .raid-badge-row { display: flex; justify-content: center; gap: 0.4rem; margin: 0.35rem 0; flex-wrap: wrap; }',
-        '        .raid-badge { display: inline-flex; align-items: center; padding: 0.2rem 0.8rem; border-radius: 999px; font-weight: 600; font-size: 0.85rem; text-transform: capitalize; }',
-        '        .tier-legendary { background-color: #d4af37; color: #1f1f1f; }',
-        '        .tier-shadow { background: linear-gradient(120deg, #2c003e, #5a189a); color: #fff; }',
-        '        .tier-mega { background: linear-gradient(120deg, #00acc1, #2ec4b6); color: #fff; }',
-        '        .difficulty-easy { background-color: #2e7d32; color: #fff; }',
-        '        .difficulty-medium { background-color: #66bb6a; color: #1f1f1f; }',
-        '        .difficulty-warning { background-color: #ffeb3b; color: #1f1f1f; }',
-        '        .difficulty-hard { background-color: #fb8c00; color: #1f1f1f; }',
-        '        .difficulty-extreme { background-color: #c62828; color: #fff; }',
-        '        .difficulty-unknown { background-color: #b0bec5; color: #1f1f1f; }',
-        '        .raid-card img { margin: 0 auto 0.5rem; }',
-        f'        {TYPE_BADGE_STYLES}',
-        '    </style>',
-        '</head>',
-        '<body>',
-        '<main class="container">'
-    ]
+    script_name = environ.get('SCRIPT_NAME', '')
+    started = time.perf_counter()
+    snapshot = get_raid_snapshot()
+    record_stage(environ, 'snapshot', started)
+    return cached_response(
+        environ, start_response, ('page', raid_type1, raid_type2, script_name), 'text/html; charset=utf-8',
+        lambda now: render_page(raid_type1, raid_type2, script_name, raid_section=snapshot.raid_section(now, script_name)),
+        snapshot,
+    )
 
-    raid_list = load_available_raids()
-
-    if raid_type1:
-        (effective_attackers, double_attackers, resisting_attackers) = calculate_effectiveness(raid_type1, raid_type2 or None)
-        heading_types = [raid_type1] + ([raid_type2] if raid_type2 else [])
-        body_parts.append('<section class="results">')
-        body_parts.append(render_type_badges('Effective Attackers for Raid Type(s)', heading_types, tag='h1'))
-        if effective_attackers:
-            search_string = generate_search_string(effective_attackers)
-            body_parts.append(render_type_badges('Effective attackers', effective_attackers))
-            body_parts.append(render_copy_block('Search string', search_string, 'search-string'))
-        else:
-            body_parts.append('<p>No effective attackers found.</p>')
-
-        # if resisting_attackers:
-        #     body_parts.append(render_type_badges('Resistances', resisting_attackers))
-
-        if double_attackers:
-            body_parts.append(render_type_badges('Double effective attackers', double_attackers))
-            double_search = generate_search_string(double_attackers)
-            body_parts.append(render_copy_block('Double effective', double_search, 'double-search-string'))
-        body_parts.append('</section>')
-
-    raid_section_html = ""
-    if raid_list:
-        raid_cards = []
-        for raid in raid_list:
-            image_html = (
-                f'<img src="{html.escape(raid["image"])}" alt="{html.escape(raid["pokemon"])}" style="max-width:100px;display:block;">'
-                if raid.get("image") else ''
-            )
-            link_start = (
-                f'<a href="{html.escape(raid["url"])}" target="_blank" rel="noopener">'
-                if raid.get("url") else '<span>'
+
+def render_results(raid_type1, raid_type2):
+    if not raid_type1:
+        return ''
+    (effective_attackers, double_attackers, resisting_attackers) = calculate_effectiveness(raid_type1, raid_type2 or None)
+    heading_types = [raid_type1] + ([raid_type2] if raid_type2 else [])
+    body_parts = ['<section class="results">']
+    body_parts.append(render_type_badges('Effective Attackers for Raid Type(s)', heading_types, tag='h1'))
+    if effective_attackers:
+        search_string = generate_search_string(effective_attackers)
+        body_parts.append(render_type_badges('Effective attackers', effective_attackers))
+        body_parts.append(render_copy_block('Search string', search_string, 'search-string'))
+    else:
+        body_parts.append('<p>No effective attackers found.</p>')
+
+    # if resisting_attackers:
+    #     body_parts.append(render_type_badges('Resistances', resisting_attackers))
+
+    if double_attackers:
+        body_parts.append(render_type_badges('Double effective attackers', double_attackers))
+        double_search = generate_search_string(double_attackers)
+        body_parts.append(render_copy_block('Double effective', double_search, 'double-search-string'))
+    body_parts.append('</section>')
+    return ''.join(body_parts)
+
+
+def render_raid_section(raid_list, script_name=''):
+    if not raid_list:
+        return ''
+    raid_cards = []
+    for raid in raid_list:
+        image_html = (
+            f'<img src="{html.escape(raid["image"])}" alt="{html.escape(raid["pokemon"])}" style="max-width:100px;display:block;">'
+            if raid.get("image") else ''
+        )
+        link_start = (
+            f'<a href="{html.escape(raid["url"])}" target="_blank" rel="noopener">'
+            if raid.get("url") else '<span>'
+        )
+        link_end = '</a>' if raid.get("url") else '</span>'
+        card_class = "upcoming" if raid.get("state") == "upcoming" else ""
+        tier_badge = f"<span class='raid-badge {raid.get('tier_class', '')}'>{html.escape(raid.get('tier', ''))}</span>" if raid.get("tier") else ""
+        difficulty_text = raid.get("difficulty")
+        diff_class = difficulty_class(raid.get("difficulty_level"))
+        difficulty_badge = (
+            f"<span class='raid-badge {diff_class}'>{html.escape(difficulty_text)}</span>"
+            if difficulty_text else ""
+        )
+        badge_row = f"<div class='raid-badge-row'>{tier_badge}{difficulty_badge}</div>"
+        counters_link = ''
+        if raid.get("types"):
+            type_badges = ''.join(
+                f'<span class="type-badge type-{ptype}">{ptype.capitalize()}</span>' for ptype in raid["types"]
             )
-            link_end = '</a>' if raid.get("url") else '</span>'
-            card_class = "upcoming" if raid.get("state") == "upcoming" else ""
-            tier_badge = f"<span class='raid-badge {raid.get('tier_class', '')}'>{html.escape(raid.get('tier', ''))}</span>" if raid.get("tier") else ""
-            difficulty_text = raid.get("difficulty")
-            diff_class = difficulty_class(raid.get("difficulty_level"))
-            difficulty_badge = (
-                f"<span class='raid-badge {diff_class}'>{html.escape(difficulty_text)}</span>"
-                if difficulty_text else ""
+            counters_link = (
+                f"<a class='raid-counters' href=\"{html.escape(script_name)}/{'/'.join(raid['types'])}\" "
+                f"title='Counters for {html.escape(raid['pokemon'])}'>{type_badges}</a>"
             )
-            badge_row = f"<div class='raid-badge-row'>{tier_badge}{difficulty_badge}</div>"
-            raid_cards.append(
-                (
-                    f"<article class='raid-card {card_class}'>"
-                    f"{image_html}{link_start}<strong>{html.escape(raid['pokemon'])}</strong>{link_end}"
-                    f"{badge_row}<p>{raid['status']}</p></article>"
-                )
+        raid_cards.append(
+            (
+                f"<article class='raid-card {card_class}'>"
+                f"{image_html}{link_start}<strong>{html.escape(raid['pokemon'])}</strong>{link_end}"
+                f"{badge_row}{counters_link}<p>{raid['status']}</p></article>"
             )
-        raid_section_html = """
+        )
+    return """
         <section>
             <h2>Tier 5+ Raids (Next 3 Days)</h2>
             <div class="raid-grid">
         """ + ''.join(raid_cards) + """</div></section>
         """
 
-    form_action = html.escape(environ.get('SCRIPT_NAME', ''))
 
-    body_parts.append(f"""
+PAGE_TEMPLATE = ''.join([
+    '<!DOCTYPE html>',
+    '<html lang="en">',
+    '<head>',
+    '    <meta charset="utf-8">',
+    '    <meta name="viewport" content="width=device-width, initial-scale=1.0">',
+    '    <title>Pokémon Go Raid Helper</title>',
+    '    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/@picocss/pico@2/css/pico.min.css">',
+    f'    <link rel="stylesheet" href="{{script_name}}/static/{STATIC_CSS_NAME}">',
+    '</head>',
+    '<body>',
+    '<main class="container">',
+    '{results}',
+    """
         <section>
             <h2>Enter Raid Types</h2>
-            <form method="get" action="{form_action}" class="raid-form">
+            <form method="get" action="{script_name}" class="raid-form">
                 <label for="raid_type1">
                     Raid Type 1
-                    {generate_dropdown('raid_type1', raid_type1)}
+                    {dropdown1}
                 </label>
                 <label for="raid_type2">
                     Raid Type 2 (optional)
-                    {generate_dropdown('raid_type2', raid_type2)}
+                    {dropdown2}
                 </label>
                 <button type="submit">Submit</button>
             </form>
@@ -452,51 +1561,365 @@ def application(environ, start_response):
                 <button type="submit">Search</button>
             </form>
         </section>
-        {raid_section_html}
+        {raid_section}
     </main>
-    """)
-
-    body_parts.append("""
-    <script>
-    document.addEventListener('click', async (event) => {
-        const button = event.target.closest('button[data-copy-target]');
-        if (!button) {
-            return;
-        }
-        const targetId = button.getAttribute('data-copy-target');
-        const textarea = document.getElementById(targetId);
-        if (!textarea) {
-            return;
-        }
-        try {
-            await navigator.clipboard.writeText(textarea.value);
-            const originalLabel = button.textContent;
-            button.textContent = 'Copied!';
-            setTimeout(() => {
-                button.textContent = originalLabel;
-            }, 1500);
-        } catch (err) {
-            console.error('Copy failed', err);
-        }
-    });
+    """,
+    f"""
+    <script src="{{script_name}}/static/{STATIC_JS_NAME}"></script>
+    </body></html>
+    """,
+])
+
+
+def compile_template(template):
+    """Split a str.format-style template into (literal bytes, field name or None) pairs."""
+    return [
+        (literal.encode('utf-8'), field)
+        for literal, field, _, _ in string.Formatter().parse(template)
+    ]
 
-    const pokebattlerForm = document.getElementById('pokebattler_form');
-    const pokebattlerNameInput = document.getElementById('pokebattler_name');
-    const pokebattlerQueryField = document.getElementById('pokebattler_query_field');
-    if (pokebattlerForm && pokebattlerNameInput && pokebattlerQueryField) {
-        pokebattlerForm.addEventListener('submit', () => {
-            const name = pokebattlerNameInput.value.trim();
-            pokebattlerQueryField.value = name ? `site:pokebattler.com ${name}` : 'site:pokebattler.com';
-        });
+
+PAGE_SEGMENTS = compile_template(PAGE_TEMPLATE)
+# Everything a deploy can change in a rendered page or API body without the data changing.
+# It is folded into every ETag, and BUILD_TIME into Last-Modified, so neither validator
+# lets a client keep a response rendered by the previous build.
+BUILD_FINGERPRINT = hashlib.sha1(
+    repr((STATIC_CSS_NAME, STATIC_JS_NAME, PAGE_TEMPLATE, sorted(SEARCH_STRINGS.items()))).encode('utf-8')
+).hexdigest()[:12]
+BUILD_TIME = datetime.fromtimestamp(int(os.stat(__file__).st_mtime), timezone.utc)
+# Every rendering of both dropdowns: nothing selected plus one per type.
+DROPDOWNS = {
+    name: {selected: generate_dropdown(name, selected).encode('utf-8') for selected in [''] + pokemon_types}
+    for name in ('raid_type1', 'raid_type2')
+}
+RESULTS_CACHE = {}
+
+
+def render_page(raid_type1, raid_type2, script_name, raid_list=None, raid_section=None):
+    """Return the page as a list of byte chunks; only the dynamic fields are encoded per call.
+
+    raid_section is the pre-encoded raid grid (see RaidSnapshot.raid_section); without it the
+    grid is rendered from raid_list.
+    """
+    results = RESULTS_CACHE.get((raid_type1, raid_type2))
+    if results is None:
+        results = RESULTS_CACHE[(raid_type1, raid_type2)] = render_results(raid_type1, raid_type2).encode('utf-8')
+    fields = {
+        'script_name': html.escape(script_name).encode('utf-8'),
+        'results': results,
+        'dropdown1': DROPDOWNS['raid_type1'][raid_type1],
+        'dropdown2': DROPDOWNS['raid_type2'][raid_type2],
+        'raid_section': raid_section if raid_section is not None else render_raid_section(raid_list, script_name).encode('utf-8'),
     }
-    </script>
-    </body></html>
-    """)
+    chunks = []
+    for literal, field in PAGE_SEGMENTS:
+        if literal:
+            chunks.append(literal)
+        if field and fields[field]:
+            chunks.append(fields[field])
+    return chunks
 
-    response_body = ''.join(body_parts)
-    start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8'), ('Content-Length', str(len(response_body.encode('utf-8'))))])
-    return [response_body.encode('utf-8')]
 
+def static_site_pages():
+    """Yield every path application can render as a page: the index plus single and dual types."""
+    yield ''
+    for raid_type1 in pokemon_types:
+        yield f'/{raid_type1}'
+        for raid_type2 in pokemon_types:
+            if raid_type2 != raid_type1:
+                yield f'/{raid_type1}/{raid_type2}'
 
-if __name__ == '__main__':
+
+def render_static(path_info, script_name, accept_encoding=''):
+    """Run one GET through application and return (status, body)."""
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path_info,
+        'SCRIPT_NAME': script_name,
+        'QUERY_STRING': '',
+        'HTTP_ACCEPT_ENCODING': accept_encoding,
+    }
+    response = {}
+
+    def start_response(status, headers):
+        response['status'] = status
+        response['headers'] = dict(headers)
+
+    body = b''.join(application(environ, start_response))
+    return response['status'], response['headers'], body
+
+
+def write_if_changed(path, body, incremental):
+    if incremental:
+        try:
+            with open(path, 'rb') as fp:
+                if fp.read() == body:
+                    return False
+        except OSError:
+            pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(body)
+    os.replace(tmp_path, path)
+    return True
+
+
+def build_static_site(output_dir, script_name='', incremental=False):
+    """Render every page and static asset (plus .gz variants) into output_dir.
+
+    Returns (written, unchanged) file counts; with incremental=True identical files are left alone.
+    """
+    targets = [(page, os.path.join(output_dir, page.strip('/'), 'index.html')) for page in static_site_pages()]
+    targets += [(f'/static/{name}', os.path.join(output_dir, 'static', name)) for name in STATIC_ASSETS]
+    written = unchanged = 0
+    for path_info, file_path in targets:
+        for accept_encoding, suffix in (('', ''), ('gzip', '.gz')):
+            status, headers, body = render_static(path_info, script_name, accept_encoding)
+            if not status.startswith('200'):
+                raise RuntimeError(f'{path_info} rendered {status}')
+            if suffix and headers.get('Content-Encoding') != 'gzip':
+                continue
+            if write_if_changed(file_path + suffix, body, incremental):
+                written += 1
+            else:
+                unchanged += 1
+    return written, unchanged
+
+
+SERVER_NAME = 'raid.py'
+KEEPALIVE_TIMEOUT = 75
+MAX_HEADER_BYTES = 64 * 1024
+MAX_REQUEST_BODY = 1024 * 1024
+SHUTDOWN_GRACE = 10
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+async def read_request(reader, server_port):
+    """Read one request off a connection and return (environ, keep_alive), or None at EOF."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial.strip():
+            raise HTTPError('400 Bad Request')
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError('431 Request Header Fields Too Large')
+    # RFC 9112 asks servers to ignore empty lines ahead of a request line.
+    lines = head.decode('latin-1').lstrip('\r\n').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HTTPError('400 Bad Request')
+    if version not in ('HTTP/1.1', 'HTTP/1.0'):
+        raise HTTPError('505 HTTP Version Not Supported')
+    path, _, query = target.partition('?')
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote(path, encoding='latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': version,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise HTTPError('400 Bad Request')
+        key = name.strip().upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.strip()
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    if 'HTTP_TRANSFER_ENCODING' in environ:
+        raise HTTPError('501 Not Implemented')
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise HTTPError('400 Bad Request')
+    if length < 0:
+        raise HTTPError('400 Bad Request')
+    if length > MAX_REQUEST_BODY:
+        raise HTTPError('413 Payload Too Large')
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        # The client closed the connection before sending the body it announced.
+        raise HTTPError('400 Bad Request')
+    environ['wsgi.input'] = io.BytesIO(body)
+    connection = environ.get('HTTP_CONNECTION', '').lower()
+    if version == 'HTTP/1.1':
+        keep_alive = 'close' not in connection
+    else:
+        keep_alive = 'keep-alive' in connection
+    return environ, keep_alive
+
+
+def run_application(environ, keep_alive):
+    """Call application and return the serialized response bytes."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = headers
+
+    result = application(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    status = response['status']
+    head = [f'HTTP/1.1 {status}']
+    has_length = False
+    for name, value in response['headers']:
+        has_length = has_length or name.lower() == 'content-length'
+        head.append(f'{name}: {value}')
+    if not has_length and not status.startswith(('304', '204')):
+        head.append(f'Content-Length: {len(body)}')
+    head.append(f'Date: {formatdate(usegmt=True)}')
+    head.append(f'Server: {SERVER_NAME}')
+    if not keep_alive:
+        head.append('Connection: close')
+    elif environ['SERVER_PROTOCOL'] == 'HTTP/1.0':
+        head.append('Connection: keep-alive')
+    data = ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1')
+    if environ['REQUEST_METHOD'] == 'HEAD':
+        return data
+    return data + body
+
+
+def error_response(status):
+    body = status.encode('latin-1')
+    return (
+        f'HTTP/1.1 {status}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n'
+        f'Connection: close\r\nServer: {SERVER_NAME}\r\n\r\n'
+    ).encode('latin-1') + body
+
+
+class RaidServer:
+    """Single-process asyncio HTTP/1.1 server for application.
+
+    Connections are kept alive and pipelined requests are answered in order. On
+    SIGTERM/SIGINT it stops accepting and closes idle connections at once. Connections
+    with a request in flight get up to SHUTDOWN_GRACE seconds to finish it (and are
+    closed afterwards); any still busy then are cancelled.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.connections = set()
+        self.busy = set()
+        self.stopping = None
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    request = await asyncio.wait_for(read_request(reader, self.port), KEEPALIVE_TIMEOUT)
+                except HTTPError as exc:
+                    writer.write(error_response(exc.status))
+                    break
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                self.busy.add(task)
+                environ, keep_alive = request
+                keep_alive = keep_alive and not self.stopping.is_set()
+                try:
+                    writer.write(run_application(environ, keep_alive))
+                    await writer.drain()
+                except ConnectionError:
+                    break
+                except Exception:
+                    traceback.print_exc()
+                    writer.write(error_response('500 Internal Server Error'))
+                    break
+                finally:
+                    self.busy.discard(task)
+                if not keep_alive:
+                    break
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def serve(self):
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stopping.set)
+        server = await asyncio.start_server(
+            self.handle, self.host, self.port, limit=MAX_HEADER_BYTES, backlog=1024, reuse_address=True,
+        )
+        print(f"Serving on http://{self.host}:{self.port}", flush=True)
+        async with server:
+            await self.stopping.wait()
+            server.close()
+            # Idle keep-alive connections are waiting on a read; only busy ones get the grace period.
+            for task in self.connections - self.busy:
+                task.cancel()
+            deadline = loop.time() + SHUTDOWN_GRACE
+            while self.connections and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+            for task in list(self.connections):
+                task.cancel()
+        print("Server stopped", flush=True)
+
+
+def serve(host='0.0.0.0', port=8000):
+    asyncio.run(RaidServer(host, port).serve())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pokémon Go raid counter pages, served via CGI/WSGI.")
+    parser.add_argument("--build-static", metavar="DIR", help="Render every page into DIR for a static web server")
+    parser.add_argument("--incremental", action="store_true", help="With --build-static, only rewrite files whose content changed")
+    parser.add_argument("--script-name", default="", help="URL prefix the static pages will be served under")
+    parser.add_argument("--serve", action="store_true", help="Serve the app with the built-in asyncio HTTP/1.1 server")
+    parser.add_argument("--host", default="0.0.0.0", help="Address for --serve to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --serve to listen on")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.build_static:
+        written, unchanged = build_static_site(args.build_static, args.script_name.rstrip('/'), args.incremental)
+        print(f"Wrote {written} files to {args.build_static} ({unchanged} unchanged)")
+        return 0
+    if args.serve:
+        serve(args.host, args.port)
+        return 0
     CGIHandler().run(application)
+    return 0
+
+
+if os.environ.get("RAID_PRELOAD") == "1":
+    preload()
+
+
+if __name__ == '__main__':
+    if 'GATEWAY_INTERFACE' in os.environ:
+        CGIHandler().run(application)
+    else:
+        raise SystemExit(main())
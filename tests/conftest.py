@@ -0,0 +1,48 @@
+import io
+
+import pytest
+
+import availableraids
+import benchmark
+import raid
+
+
+@pytest.fixture
+def raid_data(tmp_path, monkeypatch):
+    """A fresh scraper snapshot of synthetic raids that raid.application serves from."""
+    data_path = tmp_path / "available_raids.json"
+    availableraids.publish_output(data_path, benchmark.synthetic_raids(20))
+    monkeypatch.setenv("RAID_DATA_PATH", str(data_path))
+    raid._snapshots.clear()
+    raid._versions.clear()
+    raid._changelogs.clear()
+    raid.response_cache.clear()
+    yield data_path
+    raid._snapshots.clear()
+    raid._versions.clear()
+    raid._changelogs.clear()
+    raid.response_cache.clear()
+
+
+@pytest.fixture
+def call():
+    """Run one request through raid.application; returns (status, headers dict, body bytes)."""
+    def request(path_info, method="GET", query="", body=b"", **headers):
+        captured = {}
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path_info,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": query,
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+        }
+        environ.update({f"HTTP_{name.upper()}": value for name, value in headers.items()})
+
+        def start_response(status, response_headers):
+            captured["status"] = status
+            captured["headers"] = dict(response_headers)
+
+        payload = b"".join(raid.application(environ, start_response))
+        return captured["status"], captured["headers"], payload
+    return request
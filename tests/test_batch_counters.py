@@ -0,0 +1,67 @@
+import io
+import json
+
+import pytest
+
+import raid
+
+
+class LimitedInput(io.BytesIO):
+    """wsgi.input that records the largest read it was asked for."""
+
+    largest = 0
+
+    def read(self, size=-1):
+        LimitedInput.largest = max(LimitedInput.largest, size if size is not None and size >= 0 else 1 << 62)
+        return super().read(size)
+
+
+def post(content_length, body=b""):
+    captured = {}
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/api/counters",
+        "SCRIPT_NAME": "",
+        "QUERY_STRING": "",
+        "CONTENT_LENGTH": content_length,
+        "wsgi.input": LimitedInput(body),
+    }
+    body = b"".join(raid.application(environ, lambda status, headers: captured.setdefault("status", status)))
+    return captured["status"], json.loads(body)
+
+
+@pytest.mark.parametrize("content_length", ["-1", "-100000", "abc"])
+def test_invalid_content_length_is_rejected(raid_data, content_length):
+    LimitedInput.largest = 0
+    status, payload = post(content_length, b'["fire"]' * 20000)
+    assert status == "400 Bad Request"
+    assert LimitedInput.largest == 0
+
+
+def test_oversized_body_is_rejected_without_reading(raid_data):
+    LimitedInput.largest = 0
+    status, _ = post(str(raid.MAX_BATCH_BYTES + 1), b"x" * (raid.MAX_BATCH_BYTES + 1))
+    assert status == "413 Payload Too Large"
+    assert LimitedInput.largest == 0
+
+
+def test_batch_reads_at_most_the_limit(raid_data):
+    LimitedInput.largest = 0
+    status, payload = post("10", b'[["fire"]]')
+    assert status == "200 OK"
+    assert payload["results"] == [{"query": ["fire"], "counters": "fire"}]
+    assert LimitedInput.largest <= raid.MAX_BATCH_BYTES + 1
+
+
+def test_type_pairs_share_counters_in_either_order(raid_data):
+    boss = next(raid for raid in raid.get_raid_snapshot().raids if len(raid["types"]) == 2)
+    items = [["fire", "water"], ["water", "fire"], ["water", "water"], ["water"], boss["types"][::-1], boss["slug"]]
+    body = json.dumps(items).encode()
+    status, payload = post(str(len(body)), body)
+    assert status == "200 OK"
+    keys = [result["counters"] for result in payload["results"]]
+    assert keys[0] == keys[1] == "fire/water"
+    assert keys[2] == keys[3] == "water"
+    assert keys[4] == keys[5]
+    assert sorted(payload["counters"]) == sorted({"fire/water", "water", keys[4]})
+    assert payload["counters"]["fire/water"]["types"] == ["fire", "water"]
@@ -0,0 +1,34 @@
+import json
+
+import benchmark
+
+
+def test_synthetic_page_is_deterministic():
+    assert benchmark.synthetic_page(20, 4) == benchmark.synthetic_page(20, 4)
+    assert benchmark.synthetic_page(20, 4) != benchmark.synthetic_page(20, 4, seed=1)
+
+
+def test_compare_labels_the_direction_of_each_change(tmp_path, capsys):
+    def report(name, results):
+        path = tmp_path / name
+        path.write_text(json.dumps({"results": results}))
+        return str(path)
+
+    baseline = report("baseline.json", {
+        "faster_call": {"unit": "s", "value": 0.002},
+        "slower_call": {"unit": "s", "value": 0.001},
+        "more_rps": {"unit": "rps", "value": 1000},
+        "fewer_rps": {"unit": "rps", "value": 1000},
+    })
+    current = report("current.json", {
+        "faster_call": {"unit": "s", "value": 0.001},
+        "slower_call": {"unit": "s", "value": 0.002},
+        "more_rps": {"unit": "rps", "value": 2000},
+        "fewer_rps": {"unit": "rps", "value": 500},
+    })
+    assert benchmark.main(["compare", baseline, current]) == 1
+    lines = {line.split()[1]: line.split() for line in capsys.readouterr().out.splitlines() if line.startswith(("ok", "REG"))}
+    assert lines["faster_call"] == ["ok", "faster_call", "50.0%", "faster"]
+    assert lines["slower_call"] == ["REGRESSED", "slower_call", "100.0%", "slower"]
+    assert lines["more_rps"] == ["ok", "more_rps", "50.0%", "faster"]
+    assert lines["fewer_rps"] == ["REGRESSED", "fewer_rps", "100.0%", "slower"]
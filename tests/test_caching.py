@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+from email.utils import formatdate
+
+import pytest
+
+import availableraids
+import benchmark
+import raid
+
+
+def test_etag_changes_with_build(raid_data, call, monkeypatch):
+    _, page, _ = call("/fire")
+    _, counters, _ = call("/api/counters/fire")
+    monkeypatch.setattr(raid, "BUILD_FINGERPRINT", "next-build")
+    raid.response_cache.clear()
+    status, headers, _ = call("/fire", if_none_match=page["ETag"])
+    assert status == "200 OK"
+    assert headers["ETag"] != page["ETag"]
+    status, headers, _ = call("/api/counters/fire", if_none_match=counters["ETag"])
+    assert status == "200 OK"
+    assert headers["ETag"] != counters["ETag"]
+
+
+def test_if_modified_since_before_deploy_is_not_honoured(raid_data, call, monkeypatch):
+    status, headers, _ = call("/")
+    assert status == "200 OK"
+    since = headers["Last-Modified"]
+    assert call("/", if_modified_since=since)[0] == "304 Not Modified"
+    deployed = raid.BUILD_TIME + timedelta(days=1)
+    monkeypatch.setattr(raid, "BUILD_TIME", deployed)
+    status, headers, _ = call("/", if_modified_since=since)
+    assert status == "200 OK"
+    assert headers["Last-Modified"] == formatdate(deployed.timestamp(), usegmt=True)
+
+
+
+@pytest.mark.parametrize("path, accept, compressed", [
+    ("/fire", "gzip", True),
+    ("/fire", "identity", False),
+    # Below COMPRESS_MIN_SIZE, so sent as identity even to a gzip client.
+    ("/api/counters/fire", "gzip", False),
+    ("/api/counters/fire", "identity", False),
+])
+def test_not_modified_repeats_the_etag_of_the_200(raid_data, call, path, accept, compressed):
+    status, headers, body = call(path, accept_encoding=accept)
+    assert status == "200 OK"
+    assert headers.get("Content-Encoding") == ("gzip" if compressed else None)
+    assert headers["ETag"].endswith('-gzip"') == compressed
+    for cold in (False, True):
+        if cold:
+            raid.response_cache.clear()
+        status, revalidated, _ = call(path, accept_encoding=accept, if_none_match=headers["ETag"])
+        assert status == "304 Not Modified"
+        assert revalidated["ETag"] == headers["ETag"]
+
+
+def test_api_raids_revalidates_until_the_data_changes(raid_data, call):
+    status, headers, body = call("/api/raids")
+    assert status == "200 OK"
+    assert headers["Content-Type"] == "application/json"
+    payload = json.loads(body)
+    status, revalidated, body = call("/api/raids", if_none_match=headers["ETag"])
+    assert (status, body) == ("304 Not Modified", b"")
+    assert revalidated["ETag"] == headers["ETag"]
+
+    raids = benchmark.synthetic_raids(20)
+    raids[0]["difficulty"] = "9"
+    availableraids.publish_output(raid_data, raids)
+    status, changed, body = call("/api/raids", if_none_match=headers["ETag"])
+    assert status == "200 OK"
+    assert changed["ETag"] != headers["ETag"]
+    assert json.loads(body)["version"] == payload["version"] + 1
@@ -0,0 +1,66 @@
+import json
+import os
+
+import availableraids
+import benchmark
+import raid
+
+
+def test_published_snapshot_carries_its_version(raid_data):
+    raids = benchmark.synthetic_raids(20)
+    assert availableraids.publish_output(raid_data, raids) is None
+    raids[0]["difficulty"] = "9"
+    assert availableraids.publish_output(raid_data, raids) == 2
+    assert json.loads(open(raid.snapshot_file_path(str(raid_data))).read())["version"] == 2
+    entries = json.loads(open(raid.changelog_path(str(raid_data))).read())["entries"]
+    assert [entry["version"] for entry in entries] == [1, 2]
+    assert [change["slug"] for change in entries[-1]["updated"]] == [raids[0]["slug"]]
+
+
+def test_api_raids_version_comes_from_the_file(raid_data, call):
+    status, headers, body = call("/api/raids")
+    assert json.loads(body)["version"] == 1
+    # A counter that has moved ahead of the file must not leak into the body or validators.
+    with open(raid.version_file_path(str(raid_data)), "r+b") as fp:
+        fp.write(raid.VERSION_STRUCT.pack(7))
+    raid.response_cache.clear()
+    status, again, body = call("/api/raids")
+    assert json.loads(body)["version"] == 1
+    assert again["ETag"] == headers["ETag"]
+
+
+def test_stale_changelog_entries_are_replaced(raid_data):
+    availableraids.append_changelog(raid_data, 2, {"added": [], "updated": [], "removed": ["ghost"]})
+    raids = benchmark.synthetic_raids(20)
+    raids[0]["difficulty"] = "9"
+    assert availableraids.publish_output(raid_data, raids) == 2
+    entries = json.loads(open(raid.changelog_path(str(raid_data))).read())["entries"]
+    assert [entry["version"] for entry in entries] == [1, 2]
+    assert entries[-1]["removed"] != ["ghost"]
+
+
+def test_legacy_list_stays_readable_for_rollback(raid_data):
+    legacy = json.loads(raid_data.read_text())
+    assert isinstance(legacy, list) and {"pokemon", "tier_raw", "start_utc"} <= set(legacy[0])
+    snapshot = raid.get_raid_snapshot()
+    assert snapshot.path == raid.snapshot_file_path(str(raid_data))
+    assert snapshot.change_version == 1
+
+
+def test_newer_legacy_list_wins_over_a_stale_snapshot(raid_data):
+    # A scraper from before the v2 format rewrote the list after the snapshot.
+    raids = benchmark.synthetic_raids(5)
+    availableraids.write_atomic(raid_data, availableraids.serialize_output(raids, "v1"))
+    stat = os.stat(raid.snapshot_file_path(str(raid_data)))
+    os.utime(raid_data, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    raid._snapshots.clear()
+    snapshot = raid.get_raid_snapshot()
+    assert snapshot.path == str(raid_data)
+    assert len(snapshot.raids) < 20
+
+
+def test_v1_format_removes_the_snapshot(raid_data):
+    raids = benchmark.synthetic_raids(20)
+    assert availableraids.publish_output(raid_data, raids, "v1") == 2
+    assert not os.path.exists(raid.snapshot_file_path(str(raid_data)))
+    assert availableraids.publish_output(raid_data, raids, "v1") is None
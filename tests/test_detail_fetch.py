@@ -0,0 +1,93 @@
+"""populate_missing_images against a local detail-page server with per-page latency."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import availableraids
+
+SLUGS = [f"BOSS_{index}" for index in range(12)]
+
+
+class DetailHandler(BaseHTTPRequestHandler):
+    # Later bosses answer first, so completion order is the reverse of raid order.
+    latency = {slug: 0.01 * (len(SLUGS) - index) for index, slug in enumerate(SLUGS)}
+    missing = {"BOSS_3"}
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def do_GET(self):
+        slug = self.path.rsplit("/", 1)[-1]
+        with DetailHandler.lock:
+            DetailHandler.in_flight += 1
+            DetailHandler.peak = max(DetailHandler.peak, DetailHandler.in_flight)
+        try:
+            time.sleep(self.latency.get(slug, 0.0))
+            if slug in self.missing:
+                body = b"<html><body>no image here</body></html>"
+            else:
+                body = f'<html><head><meta property="og:image" content="https://img.test/{slug}.png"></head></html>'.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with DetailHandler.lock:
+                DetailHandler.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def detail_server(monkeypatch):
+    monkeypatch.setattr(DetailHandler, "latency", dict(DetailHandler.latency))
+    DetailHandler.in_flight = DetailHandler.peak = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DetailHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/raids"
+    server.shutdown()
+    server.server_close()
+
+
+def raids():
+    return [{"_slug": slug, "pokemon": slug.title(), "image": None} for slug in SLUGS]
+
+
+def test_output_order_does_not_depend_on_concurrency(detail_server, tmp_path):
+    outputs = []
+    for concurrency in (1, 3, 8):
+        batch = raids()
+        report = availableraids.RunReport(detail_server, tmp_path / "raids.json")
+        session = availableraids.create_session(concurrency)
+        availableraids.populate_missing_images(batch, session, detail_server, concurrency=concurrency, report=report)
+        assert DetailHandler.peak <= concurrency
+        assert report.detail_pages == {"cached": 0, "fetched": len(SLUGS), "failed": 0, "skipped": 0}
+        outputs.append([(raid["_slug"], raid["image"]) for raid in batch])
+        DetailHandler.peak = 0
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert outputs[0] == [
+        (slug, None if slug in DetailHandler.missing else f"https://img.test/{slug}.png") for slug in SLUGS
+    ]
+
+
+def test_fetch_budget_returns_on_time_and_counts_skipped(detail_server, tmp_path):
+    DetailHandler.latency.update({slug: 2.0 for slug in SLUGS[2:]})
+    DetailHandler.latency.update({slug: 0.0 for slug in SLUGS[:2]})
+    budget = availableraids.parse_args(["--fetch-budget", "0.5"]).fetch_budget
+    batch = raids()
+    report = availableraids.RunReport(detail_server, tmp_path / "raids.json")
+    started = time.monotonic()
+    availableraids.populate_missing_images(
+        batch, availableraids.create_session(4), detail_server, concurrency=4, time_budget=budget, report=report
+    )
+    elapsed = time.monotonic() - started
+    assert elapsed < budget + 0.5
+    assert report.detail_pages["fetched"] == 2
+    assert report.detail_pages["skipped"] == len(SLUGS) - 2
+    assert [raid["image"] is not None for raid in batch] == [True, True] + [False] * (len(SLUGS) - 2)
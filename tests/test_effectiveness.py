@@ -0,0 +1,54 @@
+import itertools
+
+import pytest
+
+import raid
+
+
+def nested_dict_walk(raid_type1, raid_type2=None):
+    """The original calculate_effectiveness: walk type_effectiveness for every attacker."""
+    effective_attackers = []
+    double_attackers = []
+    resisting_attackers = []
+    for attacker, defender_dict in raid.type_effectiveness.items():
+        effectiveness1 = defender_dict.get(raid_type1, raid.NEUTRAL)
+        effectiveness2 = defender_dict.get(raid_type2, raid.NEUTRAL) if raid_type2 else raid.NEUTRAL
+        combined_effectiveness = effectiveness1 * effectiveness2
+        if combined_effectiveness > raid.NEUTRAL:
+            effective_attackers.append(attacker)
+        elif combined_effectiveness < raid.NEUTRAL:
+            resisting_attackers.append(attacker)
+        if combined_effectiveness > raid.DOUBLE_EFFECTIVE_THRESHOLD:
+            double_attackers.append(attacker)
+    return (effective_attackers, double_attackers, resisting_attackers)
+
+
+UNKNOWN = ["", None, "dragonite", "FIRE", " fire"]
+TYPINGS = list(itertools.product(raid.pokemon_types + UNKNOWN, [None, ""] + raid.pokemon_types + UNKNOWN))
+
+
+def as_lists(result):
+    return tuple(list(part) for part in result)
+
+
+@pytest.mark.parametrize("raid_type1", raid.pokemon_types + UNKNOWN)
+def test_calculate_effectiveness_matches_nested_walk(raid_type1):
+    for raid_type2 in [None, ""] + raid.pokemon_types + UNKNOWN:
+        expected = nested_dict_walk(raid_type1, raid_type2)
+        assert as_lists(raid.calculate_effectiveness(raid_type1, raid_type2)) == expected, (raid_type1, raid_type2)
+
+
+def test_single_type_default_argument():
+    for raid_type1 in raid.pokemon_types:
+        assert as_lists(raid.calculate_effectiveness(raid_type1)) == nested_dict_walk(raid_type1)
+
+
+def test_batch_matches_nested_walk():
+    results = raid.calculate_effectiveness_batch(TYPINGS)
+    assert len(results) == len(TYPINGS)
+    for (raid_type1, raid_type2), result in zip(TYPINGS, results):
+        assert as_lists(result) == nested_dict_walk(raid_type1, raid_type2), (raid_type1, raid_type2)
+
+
+def test_table_covers_every_typing():
+    assert len(raid.EFFECTIVENESS_TABLE) == len(raid.pokemon_types) * (len(raid.pokemon_types) + 1)
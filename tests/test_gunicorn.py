@@ -0,0 +1,67 @@
+"""gunicorn.conf.py: workers are replaced by forks of a freshly preloaded master on new data."""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+import availableraids
+import benchmark
+from test_server import free_port
+
+pytest.importorskip("gunicorn")
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def worker_pids(master):
+    path = Path(f"/proc/{master.pid}/task/{master.pid}/children")
+    return set(path.read_text().split()) if path.exists() else set()
+
+
+def wait_for(check, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = check()
+        except OSError:
+            result = None
+        if result:
+            return result
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+
+def test_new_data_recycles_workers(tmp_path):
+    data_path = tmp_path / "available_raids.json"
+    availableraids.publish_output(data_path, benchmark.synthetic_raids(20))
+    port = free_port()
+    env = dict(
+        os.environ, RAID_DATA_PATH=str(data_path), RAID_BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY="2",
+        RAID_RECYCLE_INTERVAL="0.2", PYTHONPATH=str(ROOT),
+    )
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(ROOT / "gunicorn.conf.py"), "raid:application"],
+        cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    def raids():
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/raids", timeout=5) as response:
+            return json.load(response)
+
+    try:
+        before = wait_for(raids)
+        workers = wait_for(lambda: len(worker_pids(master)) == 2 and worker_pids(master))
+        availableraids.publish_output(data_path, benchmark.synthetic_raids(20, seed=1))
+        wait_for(lambda: len(worker_pids(master)) == 2 and not worker_pids(master) & workers)
+        after = wait_for(lambda: (payload := raids())["version"] != before["version"] and payload)
+        assert after["raids"] != before["raids"]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(30)
@@ -0,0 +1,74 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import raid
+
+
+def remove_data(data_path):
+    data_path.unlink()
+    os.unlink(raid.snapshot_file_path(str(data_path)))
+
+
+def write_report(data_path, status, finished_at):
+    with open(raid.run_report_path(str(data_path)), "w") as fp:
+        json.dump({"status": status, "finished_at": finished_at.isoformat(), "errors": ["boom"]}, fp)
+
+
+def test_failed_run_with_fresh_data_is_healthy(raid_data, call):
+    write_report(raid_data, "failed", datetime.now(timezone.utc))
+    status, _, body = call("/healthz")
+    payload = json.loads(body)
+    assert status == "200 OK"
+    assert payload["status"] == "ok"
+    assert payload["last_run"]["status"] == "failed"
+    assert payload["last_run"]["errors"] == 1
+
+
+def test_missing_file_after_recent_successful_run_is_healthy(raid_data, call):
+    remove_data(raid_data)
+    write_report(raid_data, "unchanged", datetime.now(timezone.utc))
+    status, _, body = call("/healthz")
+    assert status == "200 OK"
+    assert json.loads(body)["data_file"] == "missing"
+
+
+def test_old_snapshot_is_unhealthy(raid_data):
+    snapshot = raid.get_raid_snapshot()
+    later = snapshot.modified + timedelta(seconds=raid.STALE_AFTER + 60)
+    healthy, payload = raid.health_payload(later, snapshot, None)
+    assert not healthy
+    assert payload["status"] == "stale"
+
+
+def test_no_data_and_no_report_is_unhealthy(raid_data, call):
+    remove_data(raid_data)
+    status, _, body = call("/healthz")
+    assert status == "503 Service Unavailable"
+    assert json.loads(body)["snapshot_age_seconds"] is None
+
+
+def test_metrics_age_matches_healthz(raid_data, call):
+    old = raid_data.stat().st_mtime - 3 * 24 * 3600
+    os.utime(raid_data, (old, old))
+    os.utime(raid.snapshot_file_path(str(raid_data)), (old, old))
+    raid._snapshots.clear()
+    write_report(raid_data, "not_modified", datetime.now(timezone.utc) - timedelta(seconds=90))
+    _, _, health = call("/healthz")
+    _, _, metrics = call("/metrics")
+    line = next(line for line in metrics.decode().splitlines() if line.startswith("raid_snapshot_age_seconds "))
+    assert abs(int(line.split()[1]) - json.loads(health)["snapshot_age_seconds"]) <= 1
+    assert json.loads(health)["snapshot_age_seconds"] < 120
+
+
+def test_server_timing_lists_only_recorded_stages(raid_data, call):
+    _, headers, _ = call("/api/counters/fire/flying", accept_encoding="gzip")
+    assert [part.split(";")[0] for part in headers["Server-Timing"].split(", ")] == ["render", "total"]
+    _, headers, _ = call("/api/counters/fire/flying", accept_encoding="gzip")
+    assert "Server-Timing" not in headers
+    _, headers, _ = call("/fire/flying", accept_encoding="gzip")
+    assert [part.split(";")[0] for part in headers["Server-Timing"].split(", ")] == ["snapshot", "render", "compress", "total"]
+    _, headers, _ = call("/fire/flying", accept_encoding="gzip")
+    assert [part.split(";")[0] for part in headers["Server-Timing"].split(", ")] == ["snapshot", "total"]
+    assert raid.route_label("/fire/flying") == "counters"
+    assert raid.route_label.cache_info().hits
@@ -0,0 +1,44 @@
+import json
+import re
+from urllib.parse import quote
+
+import pytest
+
+import availableraids
+import benchmark
+
+
+def page(blob, lowercase=False, separators=(",", ":")):
+    encoded = quote(json.dumps(blob, separators=separators), safe="-_.!~*'()")
+    if lowercase:
+        encoded = re.sub(r"%[0-9A-F]{2}", lambda match: match.group().lower(), encoded)
+    return f'<html><script>window.REHYDRATE=JSON.parse(decodeURIComponent("{encoded}"))</script></html>'
+
+
+BLOBS = [
+    {"a": {"raidsStore": {"wrong": 1}}, "raidsStore": {"right": 1}},
+    {"a": [{"pokemonStore": {"wrong": 1}}], "pokemonStore": {"right": 2}, "raidsStore": {"right": 1}},
+    {"note": '"raidsStore":{"wrong":1} \\" {[', "raidsStore": {"right": 1}, "pokemonStore": ["right"]},
+    {"note": "trailing backslash \\\\", "raidsStore": {"right": "\\"}, "pokemonStore": {}},
+    {"nested": {"deep": {"raidsStore": [1]}}},
+    {"raidsStore": 5, "pokemonStore": None},
+]
+
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")], ids=["compact", "spaced"])
+@pytest.mark.parametrize("lowercase", [False, True], ids=["upper-escapes", "lower-escapes"])
+@pytest.mark.parametrize("blob", BLOBS)
+def test_only_top_level_stores_are_extracted(blob, lowercase, separators):
+    html = page(blob, lowercase, separators)
+    keys = ("raidsStore", "pokemonStore")
+    expected = {key: blob[key] for key in keys if isinstance(blob.get(key), (dict, list))}
+    assert availableraids.extract_rehydrate_stores(html, keys=keys) == expected
+    full = availableraids.extract_rehydrate_blob(html)
+    assert all(full[key] == value for key, value in expected.items())
+
+
+def test_synthetic_page_stores_match_full_decode():
+    html = benchmark.synthetic_page(50, 100)
+    full = availableraids.extract_rehydrate_blob(html)
+    stores = availableraids.extract_rehydrate_stores(html, keys=("raidsStore", "pokemonStore"))
+    assert stores == {"raidsStore": full["raidsStore"], "pokemonStore": full["pokemonStore"]}
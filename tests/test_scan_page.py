@@ -0,0 +1,85 @@
+"""scan_page must collect exactly what a full RaidLinkParser pass over the page does."""
+
+from pathlib import Path
+
+import pytest
+
+import availableraids
+import benchmark
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def reference_results(html):
+    parser = availableraids.RaidLinkParser()
+    parser.feed(html)
+    return parser.results
+
+
+def table(*rows):
+    return "<html><body><table>" + "".join(rows) + "</table></body></html>"
+
+
+EDGE_CASES = {
+    "quoted-gt-in-attribute": table('<tr><td><a title="a>b Counters" href="/raids/C"></a></td></tr>'),
+    "script-in-anchor": table('<tr><td><a href="/raids/MEW">Mew <script>var x=1;</script> two</a></td></tr>'),
+    "style-in-difficulty": table(
+        '<tr><td><a href="/raids/MEW">Mew</a></td>'
+        '<td><span class="easyDifficulty"><style>.x{}</style></span></td></tr>'
+    ),
+    "raw-text-keeps-entities": table('<tr><td><a href="/raids/A"><script>a &amp;&amp; b</script></a></td></tr>'),
+    "table-close-inside-script": table(
+        '<tr><td><a href="/raids/A"><script>"</table>"</script>A</a></td></tr>',
+        '<tr><td><a href="/raids/B">B</a></td></tr>',
+    ),
+    "unterminated-script": table('<tr><td><a href="/raids/A">A</a></td></tr><tr><td><a href="/raids/B"><script>x'),
+    "self-closing-anchor": table('<tr><td><a href="/raids/A"/>text</td></tr>'),
+    "nested-table": table('<tr><td><table><tr><td>x</td></tr></table><a href="/raids/A">A</a></td></tr>'),
+}
+
+
+@pytest.mark.parametrize("html", EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_edge_cases_match_reference(html):
+    assert availableraids.scan_page(html).results == reference_results(html)
+
+
+def test_fixture_page_matches_reference():
+    html = (FIXTURES / "raid_rows.html").read_text(encoding="utf-8")
+    results = availableraids.scan_page(html).results
+    assert results == reference_results(html)
+    assert results["C"]["name"] == "Quoted > attribute"
+    assert results["MEW"] == {"name": "Mew var x=1; two", "image": None, "difficulty": ".x{}"}
+
+
+
+def test_synthetic_page_matches_reference():
+    html = benchmark.synthetic_page(60, 16)
+    scan = availableraids.scan_page(html)
+    assert scan.results == reference_results(html)
+    assert len(scan.results) == 60
+    assert scan.rehydrate_offset == html.index("window.REHYDRATE=")
+
+
+ICON = "//static.pokebattler.com/assets/pokemon/256/pokemon_icon_150_00.png"
+SVG_ASSET = "https://static.pokebattler.com/assets/pokemon/128/pokemon_icon_150_00.png"
+DETAIL_PAGES = {
+    "icon-only-in-og-image": (
+        f'<html><head><meta property="og:image" content="https:{ICON}"></head>'
+        f'<body><svg aria-label="Mewtwo"><image href="{SVG_ASSET}"/></svg></body></html>'
+    ),
+    "icon-in-body": (
+        '<html><head><meta property="og:image" content="https://www.pokebattler.com/banner.png"></head>'
+        f'<body><svg aria-label="Mewtwo"><image href="{SVG_ASSET}"/></svg><img src="{ICON}"></body></html>'
+    ),
+    "icon-in-table": (
+        '<html><head><meta property="og:image" content="https://www.pokebattler.com/banner.png"></head>'
+        f'<body><table><tr><td><img src="{ICON}"></td></tr></table></body></html>'
+    ),
+}
+
+
+@pytest.mark.parametrize("html", DETAIL_PAGES.values(), ids=DETAIL_PAGES.keys())
+def test_boss_icon_matches_full_page_search(html):
+    scan = availableraids.scan_page(html)
+    assert scan.boss_icon == f"https:{ICON}"
+    assert scan.boss_icon == availableraids._extract_icon_url(html, "Mewtwo")
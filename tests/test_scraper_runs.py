@@ -0,0 +1,201 @@
+"""Repeated scraper runs against a local raids page: conditional fetches and the image cache."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+import pytest
+
+import availableraids
+
+SLUGS = ["MEWTWO", "KYOGRE", "GROUDON"]
+LATER = "RAYQUAZA"
+HOUR_MS = 3600 * 1000
+
+
+def raids_page(later_start_ms=None):
+    """A raids page whose bosses have no table image, so every one needs its detail page."""
+    now_ms = int(time.time() * 1000)
+    store = [
+        {"pokemon": slug, "pokemonId": slug, "tier": "RAID_LEVEL_5", "startDate": now_ms - HOUR_MS,
+         "endDate": now_ms + 24 * HOUR_MS, "pokemonType1": "POKEMON_TYPE_PSYCHIC"}
+        for slug in SLUGS
+    ]
+    if later_start_ms is not None:
+        store.append({"pokemon": LATER, "pokemonId": LATER, "tier": "RAID_LEVEL_5", "startDate": later_start_ms,
+                      "endDate": later_start_ms + HOUR_MS, "pokemonType1": "POKEMON_TYPE_DRAGON"})
+    rows = "".join(
+        f'<tr><td><a href="/raids/{slug}">{slug.title()}</a></td></tr>' for slug in SLUGS + [LATER]
+    )
+    encoded = quote(json.dumps({"raidsStore": {"RAID_LEVEL_5": {"raids": store}}}), safe="")
+    return (
+        f"<html><body><table>{rows}</table>"
+        f'<script>window.REHYDRATE=JSON.parse(decodeURIComponent("{encoded}"))</script></body></html>'
+    )
+
+
+class RaidsHandler(BaseHTTPRequestHandler):
+    page = ""
+    send_etag = True
+    requests = []
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        RaidsHandler.requests.append((path, self.headers.get("If-None-Match")))
+        if path == "/raids":
+            etag = f'"{len(self.page)}-{hash(self.page) & 0xffff}"'
+            if self.send_etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = self.page.encode()
+        else:
+            slug = path.rsplit("/", 1)[-1]
+            body = f'<html><head><meta property="og:image" content="https://img.test/{slug}.png"></head></html>'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        if path == "/raids" and self.send_etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site(monkeypatch):
+    monkeypatch.setattr(RaidsHandler, "page", raids_page())
+    monkeypatch.setattr(RaidsHandler, "send_etag", True)
+    monkeypatch.setattr(RaidsHandler, "requests", [])
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RaidsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/raids"
+    server.shutdown()
+    server.server_close()
+
+
+def scrape(url, output, *args):
+    RaidsHandler.requests.clear()
+    assert availableraids.main(["--url", url, "--output", str(output), *args]) == 0
+    report = json.loads(availableraids.default_report_path(output).read_text())
+    detail_requests = [path for path, _ in RaidsHandler.requests if path != "/raids"]
+    return report, detail_requests
+
+
+def test_repeat_runs_reuse_cached_detail_images(site, tmp_path):
+    output = tmp_path / "available_raids.json"
+    report, detail_requests = scrape(site, output)
+    assert sorted(detail_requests) == sorted(f"/raids/{slug}" for slug in SLUGS)
+    assert report["detail_pages"] == {"cached": 0, "fetched": 3, "failed": 0, "skipped": 0}
+    written = json.loads(output.read_text())
+
+    # --force skips the conditional fetch, so the page is parsed again and images are looked up.
+    report, detail_requests = scrape(site, output, "--force")
+    assert detail_requests == []
+    assert report["detail_pages"] == {"cached": 3, "fetched": 0, "failed": 0, "skipped": 0}
+    assert json.loads(output.read_text()) == written
+    assert [raid["image"] for raid in written] == [f"https://img.test/{raid['slug']}.png" for raid in written]
+
+    report, detail_requests = scrape(site, output, "--force", "--refresh-images")
+    assert len(detail_requests) == 3
+    assert report["detail_pages"]["fetched"] == 3
+
+
+def test_unchanged_page_is_answered_by_304(site, tmp_path):
+    output = tmp_path / "available_raids.json"
+    assert scrape(site, output)[0]["status"] == "ok"
+    mtime = output.stat().st_mtime_ns
+    report, detail_requests = scrape(site, output)
+    assert report["status"] == "not_modified"
+    assert RaidsHandler.requests[0][1] is not None
+    assert detail_requests == []
+    assert output.stat().st_mtime_ns == mtime
+
+
+def test_unchanged_page_without_etag_stops_at_page_hash(site, tmp_path):
+    RaidsHandler.send_etag = False
+    output = tmp_path / "available_raids.json"
+    assert scrape(site, output)[0]["status"] == "ok"
+    mtime = output.stat().st_mtime_ns
+    report, detail_requests = scrape(site, output)
+    assert report["status"] == "unchanged"
+    assert detail_requests == []
+    assert output.stat().st_mtime_ns == mtime
+
+    RaidsHandler.page = raids_page(int(time.time() * 1000) + HOUR_MS)
+    report, _ = scrape(site, output)
+    assert report["status"] == "ok"
+    assert report["output_written"]
+
+
+def test_recheck_at_bypasses_the_conditional_fetch(site, tmp_path, monkeypatch):
+    window_ms = availableraids.UPCOMING_WINDOW_MS
+    RaidsHandler.page = raids_page(int(time.time() * 1000) + window_ms + HOUR_MS)
+    output = tmp_path / "available_raids.json"
+    scrape(site, output)
+    state_path = availableraids.default_state_path(output)
+    state = json.loads(state_path.read_text())
+    assert state["recheck_at"] == pytest.approx(time.time() * 1000 + HOUR_MS, abs=60 * 1000)
+    assert LATER not in [raid["slug"] for raid in json.loads(output.read_text())]
+
+    # Two hours on, the later raid is inside the upcoming window although the page is the same.
+    monkeypatch.setattr(availableraids, "UPCOMING_WINDOW_MS", window_ms + 2 * HOUR_MS)
+    state["recheck_at"] = int(time.time() * 1000) - 1
+    state_path.write_text(json.dumps(state))
+    report, _ = scrape(site, output)
+    assert RaidsHandler.requests[0] == ("/raids", None)
+    assert report["status"] == "ok"
+    assert LATER in [raid["slug"] for raid in json.loads(output.read_text())]
+
+
+def test_image_cache_ttls(tmp_path):
+    path = tmp_path / "images.json"
+    now = time.time()
+    path.write_text(json.dumps({
+        "FRESH": {"image": "https://img.test/FRESH.png", "name": "Fresh", "fetched_at": now - 50},
+        "STALE": {"image": "https://img.test/STALE.png", "name": "Stale", "fetched_at": now - 150},
+        "MISS": {"image": None, "name": "Miss", "fetched_at": now - 5},
+        "OLD_MISS": {"image": None, "name": "Old miss", "fetched_at": now - 15},
+    }))
+    cache = availableraids.ImageCache(path, ttl=100, negative_ttl=10)
+    cache.load()
+    assert cache.lookup("FRESH") == (True, "https://img.test/FRESH.png")
+    assert cache.lookup("STALE") == (False, None)
+    assert cache.lookup("MISS") == (True, None)
+    assert cache.lookup("OLD_MISS") == (False, None)
+    assert cache.lookup("UNKNOWN") == (False, None)
+    refreshing = availableraids.ImageCache(path, ttl=100, negative_ttl=10, refresh=True)
+    refreshing.load()
+    assert refreshing.lookup("FRESH") == (False, None)
+
+
+def test_overlapping_runs_merge_their_image_cache_saves(tmp_path):
+    path = tmp_path / "images.json"
+    path.write_text(json.dumps({"OLD": {"image": "https://img.test/OLD.png", "name": "Old", "fetched_at": time.time()}}))
+    runs = [availableraids.ImageCache(path) for _ in range(2)]
+    for index, cache in enumerate(runs):
+        cache.load()
+        cache.store(f"RUN_{index}", f"https://img.test/RUN_{index}.png", f"Run {index}")
+
+    # Hold the lock the way a third run mid-save would, so both saves queue up behind it.
+    with open(path.with_name(f"{path.name}.lock"), "a") as lock_file:
+        availableraids.fcntl.flock(lock_file, availableraids.fcntl.LOCK_EX)
+        threads = [threading.Thread(target=cache.save) for cache in runs]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        assert all(thread.is_alive() for thread in threads)
+        availableraids.fcntl.flock(lock_file, availableraids.fcntl.LOCK_UN)
+    for thread in threads:
+        thread.join(5)
+
+    saved = json.loads(path.read_text())
+    assert sorted(saved) == ["OLD", "RUN_0", "RUN_1"]
+    fresh = availableraids.ImageCache(path)
+    fresh.load()
+    assert fresh.lookup("RUN_1") == (True, "https://img.test/RUN_1.png")
@@ -0,0 +1,85 @@
+"""Every search string candidate must select exactly the attackers it was compiled for.
+
+A Pokémon qualifies when its fast move and at least one charged move have an effective type.
+The evaluator below reads the search grammar the game uses: '&' joins clauses that must all
+hold, ',' joins alternatives within a clause, '!' negates one term, and @1/@2/@3 test the
+type of the fast, first charged and second charged move.
+"""
+
+import itertools
+import random
+
+import pytest
+
+import raid
+
+TYPES = raid.pokemon_types
+# Fast move, first charged move and (possibly missing) second charged move types.
+MOVESETS = list(itertools.product(TYPES, TYPES, TYPES + [None]))
+TYPINGS = [(type1, None) for type1 in TYPES] + list(itertools.combinations(TYPES, 2))
+
+
+def bits(predicate):
+    """Bitset over MOVESETS of the movesets satisfying predicate."""
+    return sum(1 << index for index, moveset in enumerate(MOVESETS) if predicate(moveset))
+
+
+ALL = (1 << len(MOVESETS)) - 1
+TERMS = {(slot, ptype): bits(lambda moveset: moveset[slot] == ptype) for slot in range(3) for ptype in TYPES}
+
+
+def selected(search_string):
+    """Bitset of the movesets search_string matches."""
+    result = ALL
+    for clause in search_string.split("&"):
+        alternatives = 0
+        for term in clause.split(","):
+            negated = term.startswith("!")
+            term = term.lstrip("!")
+            assert term[:1] == "@" and term[1:2] in "123" and term[2:] in TYPES, term
+            moves = TERMS[(int(term[1]) - 1, term[2:])]
+            alternatives |= ALL ^ moves if negated else moves
+        result &= alternatives
+    return result
+
+
+def assert_selects_exactly(attackers, search_string):
+    attackers = set(attackers)
+    expected = bits(lambda moveset: moveset[0] in attackers and (moveset[1] in attackers or moveset[2] in attackers))
+    assert selected(search_string) == expected, (sorted(attackers), search_string)
+
+
+def attacker_sets():
+    sets = set()
+    for raid_type1, raid_type2 in TYPINGS:
+        effective, double, _ = raid.calculate_effectiveness(raid_type1, raid_type2)
+        sets.update(attackers for attackers in (effective, double) if attackers)
+    return sorted(sets)
+
+
+def test_all_typings_are_covered():
+    assert len(TYPINGS) == 171
+
+
+@pytest.mark.parametrize("attackers", attacker_sets(), ids="/".join)
+def test_typing_candidates_are_equivalent(attackers):
+    candidates = raid.search_string_candidates(attackers)
+    for search_string in candidates:
+        assert_selects_exactly(attackers, search_string)
+    assert raid.generate_search_string(attackers) == min(candidates, key=raid.search_cost)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_large_random_sets_are_equivalent(seed):
+    rng = random.Random(seed)
+    attackers = tuple(rng.sample(TYPES, rng.randint(10, len(TYPES))))
+    candidates = raid.search_string_candidates(attackers)
+    assert len(candidates) == 2
+    for search_string in candidates:
+        assert_selects_exactly(attackers, search_string)
+    compiled = raid.compile_search_string(attackers)
+    assert len(compiled) == min(map(len, candidates))
+
+
+def test_empty_set_has_no_search_string():
+    assert raid.compile_search_string(()) == ""
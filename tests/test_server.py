@@ -0,0 +1,158 @@
+"""RaidServer over real sockets: keep-alive, pipelining, HEAD, bad bodies and shutdown."""
+
+import asyncio
+import os
+import signal
+import socket
+
+import pytest
+
+import raid
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def read_response(reader, method="GET"):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = lines[0].split(" ", 1)[1]
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = b"" if method == "HEAD" or status.startswith("304") else await reader.readexactly(length)
+    return status, headers, body
+
+
+def run_server(scenario):
+    """Run scenario(port) as a client of a RaidServer, then stop the server with SIGTERM."""
+    port = free_port()
+    server = raid.RaidServer("127.0.0.1", port)
+
+    async def main():
+        serving = asyncio.create_task(server.serve())
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+            except OSError:
+                await asyncio.sleep(0.02)
+                continue
+            writer.close()
+            break
+        try:
+            return await scenario(port)
+        finally:
+            if not serving.done():
+                os.kill(os.getpid(), signal.SIGTERM)
+                await asyncio.wait_for(serving, raid.SHUTDOWN_GRACE)
+
+    return asyncio.run(main())
+
+
+def request(method, path, *headers, body=b""):
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", *headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def test_keep_alive_serves_several_requests_on_one_connection(raid_data):
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for path in ("/", "/api/raids", "/"):
+            writer.write(request("GET", path))
+            responses.append(await read_response(reader))
+        writer.close()
+        return responses
+
+    responses = run_server(scenario)
+    assert [status for status, _, _ in responses] == ["200 OK"] * 3
+    assert all("connection" not in headers for _, headers, _ in responses)
+    assert responses[0][2] == responses[2][2]
+
+
+def test_pipelined_requests_are_answered_in_order(raid_data):
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            request("GET", "/api/raids")
+            + request("HEAD", "/")
+            + request("GET", "/api/no-such-endpoint")
+            + request("GET", "/", "Connection: close")
+        )
+        responses = [
+            await read_response(reader),
+            await read_response(reader, "HEAD"),
+            await read_response(reader),
+            await read_response(reader),
+        ]
+        trailing = await reader.read()
+        writer.close()
+        return responses, trailing
+
+    responses, trailing = run_server(scenario)
+    statuses = [status for status, _, _ in responses]
+    assert statuses[0] == "200 OK" and statuses[1] == "200 OK" and statuses[3] == "200 OK"
+    assert statuses[2].startswith("404")
+    assert responses[0][1]["content-type"].startswith("application/json")
+    assert responses[1][2] == b""
+    assert int(responses[1][1]["content-length"]) == len(responses[3][2])
+    assert responses[3][1]["connection"] == "close"
+    assert trailing == b""
+
+
+@pytest.mark.parametrize("head, body", [
+    ("Content-Length: -5", b""),
+    ("Content-Length: ten", b""),
+    ("Content-Length: 10", b"abc"),
+])
+def test_bad_request_bodies_get_400_and_close(raid_data, head, body):
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request("POST", "/api/counters", head, body=body))
+        writer.write_eof()
+        response = await read_response(reader)
+        trailing = await reader.read()
+        writer.close()
+        return response, trailing
+
+    (status, headers, _), trailing = run_server(scenario)
+    assert status == "400 Bad Request"
+    assert headers["connection"] == "close"
+    assert trailing == b""
+
+
+def test_sigterm_closes_idle_connections_and_stops_listening(raid_data):
+    port = free_port()
+    server = raid.RaidServer("127.0.0.1", port)
+
+    async def main():
+        serving = asyncio.create_task(server.serve())
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                break
+            except OSError:
+                await asyncio.sleep(0.02)
+        writer.write(request("GET", "/"))
+        status, _, _ = await read_response(reader)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        os.kill(os.getpid(), signal.SIGTERM)
+        closed = await asyncio.wait_for(reader.read(), raid.SHUTDOWN_GRACE)
+        await asyncio.wait_for(serving, raid.SHUTDOWN_GRACE)
+        elapsed = loop.time() - started
+        writer.close()
+        with pytest.raises(OSError):
+            await asyncio.open_connection("127.0.0.1", port)
+        return status, closed, elapsed
+
+    status, closed, elapsed = asyncio.run(main())
+    assert status == "200 OK"
+    assert closed == b""
+    assert elapsed < 1